@@ -0,0 +1,175 @@
+import json
+import numpy as np
+from sys import argv
+from ctypes import CDLL
+from time import perf_counter_ns
+from Manipulator import Manipulator
+from PythonManipulator import PythonManipulator, ikina
+from QuadrupedLeg import QuadrupedLeg
+from QuadrupedServo import QuadrupedServo
+
+# Benchmarks the kinematics backends and prints the results as JSON, so that results from
+# different machines and backends can be diffed. Usage:
+#   python BenchmarkManipulator.py [output.json] [--quick]
+
+def main():
+	quick = "--quick" in argv
+	outputs = [a for a in argv[1:] if not a.startswith("--")]
+	rng = np.random.default_rng(0)
+
+	results = {"backends": {}}
+	for name, backend in backends().items():
+		results["backends"][name] = {
+			"ikin": benchmarkIkin(backend, rng, 100 if quick else 1000),
+			"ikinLM": benchmarkIkin(backend, rng, 100 if quick else 1000, Manipulator.SOLVER_LM),
+			"ikinBatch": benchmarkIkinBatch(backend, rng, 100 if quick else 1000),
+			"fkin": benchmarkChains(backend, rng, "fkin", 20 if quick else 200),
+			"simStep": benchmarkChains(backend, rng, "simStep", 10 if quick else 100),
+			"quadrupedLeg": benchmarkLeg(backend, rng, 50 if quick else 500)}
+
+	text = json.dumps(results, indent = 2)
+	if outputs:
+		with open(outputs[0], "w") as f:
+			f.write(text)
+	print(text)
+
+def backends():
+	b = {"python": PythonManipulator}
+	try:
+		from NumbaManipulator import NumbaManipulator
+		b = {"numba": NumbaManipulator, **b}
+	except ImportError:
+		pass
+	if isinstance(Manipulator.loadLibrary(), CDLL):
+		b = {"native": Manipulator.loadLibrary(), **b}
+	return b
+
+def latencyStats(ns):
+	ns = np.asarray(ns) / 1000
+	return {
+		"samples": len(ns),
+		"meanUs": float(ns.mean()),
+		"p50Us": float(np.percentile(ns, 50)),
+		"p90Us": float(np.percentile(ns, 90)),
+		"p99Us": float(np.percentile(ns, 99)),
+		"maxUs": float(ns.max())}
+
+def legManipulator(backend, legType = QuadrupedLeg.FRONT_RIGHT):
+	leg = QuadrupedLeg(legType, QuadrupedServo(), QuadrupedServo(), QuadrupedServo())
+	leg.manip = copyManipulator(leg.manip, backend)
+	return leg
+
+def copyManipulator(manip, backend):
+	m = Manipulator(backend)
+	for S, M, G in zip(manip.S, manip.M, manip.G):
+		m.addJoint(S, M, G)
+	m.setHome(manip.Home)
+	return m
+
+def randomChain(n, rng, backend):
+	# Revolute joints with random axes along a chain of 10 cm links
+	manip = Manipulator(backend)
+	p = np.zeros(3)
+	for i in range(n):
+		w = rng.normal(size = 3)
+		w /= np.linalg.norm(w)
+		M = [1, 0, 0, p[0], 0, 1, 0, p[1], 0, 0, 1, p[2]]
+		G = list(rng.uniform(1e-4, 1e-3, 3)) + [rng.uniform(0.1, 1)] * 3
+		manip.addRevolute(list(w), list(p), M, G)
+		p = p + 0.1 * rng.normal(size = 3) / np.sqrt(3)
+	manip.setHome(p)
+	return manip
+
+def endEffector(manip, q):
+	p0 = np.zeros(3 * manip.N)
+	p0[-3:] = manip.Home[3::4]
+	return manip.fkin(p0, q)[-3:].copy()
+
+def reachableTargets(manip, rng, count, spread = 0.5):
+	# Targets reached by random joint vectors, with warm starts perturbed from the solution
+	Q = rng.uniform(-spread, spread, (count, manip.N))
+	P = np.array([endEffector(manip, q) for q in Q])
+	Q0 = Q + rng.normal(0, 0.2, Q.shape)
+	return P, Q0
+
+def benchmarkIkin(backend, rng, count, solver = Manipulator.SOLVER_DLS):
+	leg = legManipulator(backend)
+	manip = leg.manip
+	P, Q0 = reachableTargets(manip, rng, count)
+
+	# Warm up, so that loading or compiling a backend isn't counted
+	manip.ikin(P[0], Q0[0], solver)
+
+	ns = []
+	residuals = []
+	iterations = []
+	for p, q0 in zip(P, Q0):
+		tic = perf_counter_ns()
+		q = manip.ikin(p, q0, solver)
+		ns.append(perf_counter_ns() - tic)
+		residuals.append(np.linalg.norm(endEffector(manip, q) - p))
+		iterations.append(manip.ikinIterations)
+
+	# The library doesn't report iteration counts, so they come from the Python solver,
+	# which mirrors the library's algorithm
+	if None in iterations:
+		iterations = [ikina(manip.S.ravel().tolist(), manip.Home.tolist(), manip.N, p.tolist(), 1e-4, 20e-3, 100, q0.tolist()) for p, q0 in zip(P, Q0)]
+
+	residuals = np.array(residuals)
+	return {
+		"latency": latencyStats(ns),
+		"converged": float(np.mean(residuals < 1e-4)),
+		"residualP99": float(np.percentile(residuals, 99)),
+		"iterationsMean": float(np.mean(iterations)),
+		"iterationsP50": float(np.percentile(iterations, 50)),
+		"iterationsP99": float(np.percentile(iterations, 99)),
+		"iterationsMax": int(np.max(iterations))}
+
+def benchmarkIkinBatch(backend, rng, count):
+	manip = legManipulator(backend).manip
+	P, Q0 = reachableTargets(manip, rng, count)
+	manip.ikinBatch(P[:1], Q0[:1])
+	tic = perf_counter_ns()
+	manip.ikinBatch(P, Q0)
+	ns = perf_counter_ns() - tic
+	return {"targets": count, "totalMs": ns / 1e6, "perTargetUs": ns / count / 1000}
+
+def benchmarkChains(backend, rng, method, count):
+	results = {}
+	for n in (1, 2, 3, 6, 12, 24):
+		manip = randomChain(n, rng, backend)
+		q = rng.uniform(-1, 1, n)
+		dq = np.zeros(n)
+		u = np.zeros(n)
+		p0 = np.zeros(3 * n)
+		ns = []
+		for i in range(count):
+			tic = perf_counter_ns()
+			if method == "fkin":
+				manip.fkin(p0, q)
+			else:
+				q, dq = manip.simStep(q, dq, u, 1e-3)
+			ns.append(perf_counter_ns() - tic)
+		stats = latencyStats(ns)
+		stats["callsPerSecond"] = 1e6 / stats["meanUs"]
+		results[str(n)] = stats
+	return results
+
+def benchmarkLeg(backend, rng, count):
+	results = {}
+	for mode, modeName in ((QuadrupedLeg.IKIN_ITERATIVE, "iterative"), (QuadrupedLeg.IKIN_ANALYTIC, "analytic")):
+		leg = legManipulator(backend)
+		leg.ikinMode = mode
+		ns = []
+		for i in range(count):
+			x = leg.Home[0] + rng.uniform(-1.5, 1.5)
+			y = leg.Home[1] + rng.uniform(-2, 2)
+			z = rng.uniform(-6.5, -4)
+			tic = perf_counter_ns()
+			leg.setPose(x, y, z)
+			ns.append(perf_counter_ns() - tic)
+		results[modeName] = latencyStats(ns)
+	return results
+
+if __name__ == "__main__":
+	main()
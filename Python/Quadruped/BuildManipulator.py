@@ -0,0 +1,31 @@
+import subprocess
+from os import environ, getpid, makedirs, replace
+from os.path import dirname, exists, getmtime, join, realpath
+from sys import argv, platform
+
+# Builds the kinematics library from Manipulator.c into build/ next to this file. Manipulator
+# calls build() when no installed library is found, so a C compiler is all that's needed for
+# native speed. Usage:
+#   python BuildManipulator.py [compiler]
+
+sourceFile = join(dirname(realpath(__file__)), "Manipulator.c")
+libraryFile = join(dirname(realpath(__file__)), "build", f"Manipulator.{'dll' if platform == 'win32' else 'so'}")
+
+def build(compiler = None, force = False):
+	# Rebuilds only when the library is missing or older than the source
+	if not force and exists(libraryFile) and getmtime(libraryFile) >= getmtime(sourceFile):
+		return libraryFile
+
+	compiler = compiler or environ.get("CC", "gcc" if platform == 'win32' else "cc")
+	makedirs(dirname(libraryFile), exist_ok = True)
+
+	# Floating point contraction is disabled so that results match the Python implementation.
+	# The library is built under a temporary name and then renamed, so that processes building
+	# at the same time never load a partially written file.
+	temporaryFile = f"{libraryFile}.{getpid()}"
+	subprocess.run([compiler, "-O2", "-shared", "-fPIC", "-ffp-contract=off", "-o", temporaryFile, sourceFile, "-lm"], check = True, capture_output = True)
+	replace(temporaryFile, libraryFile)
+	return libraryFile
+
+if __name__ == "__main__":
+	print(build(*argv[1:2], force = True))
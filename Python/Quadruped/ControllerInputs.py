@@ -0,0 +1,5 @@
+# Names of the controller inputs, in the order XboxController reports them. Kept apart from
+# XboxController so that modules which only need the names don't load the controller driver.
+
+AxisNames = ('LeftX', 'LeftY', 'RightX', 'RightY', 'LeftTrigger', 'RightTrigger', 'DpadX', 'DpadY')
+ButtonNames = ('A', 'B', 'X', 'Y', 'LB', 'RB', 'Start', 'Select')
@@ -0,0 +1,61 @@
+from ControllerInputs import ButtonNames
+from ScriptedController import ScriptedController
+
+class ControllerRecorder:
+	# Wraps a controller and logs every change to its inputs, timed by the update that saw it,
+	# in the file format of ScriptedController, so a session can be replayed exactly with
+	# ScriptedController.load. Buttons are logged from the wrapped controller's button events
+	# rather than its state after each update, so a press and release within one update are
+	# both kept. Button callbacks are registered with the recorder, which calls them after
+	# logging each event, and everything else is passed through to the wrapped controller.
+	def __init__(self, controller, fileName):
+		self.controller = controller
+		self.fileName = fileName
+		self.eventCount = 0
+		self._file = None
+		self._now = 0
+		self._values = [0] * len(ScriptedController.Attributes)
+		self._onButton = list(controller._onButton)
+		controller._onButton = [self._buttonEvent(i) for i in range(len(self._onButton))]
+
+	def __getattr__(self, name):
+		return getattr(self.controller, name)
+
+	def __enter__(self):
+		self.controller.__enter__()
+		self._file = open(self.fileName, "wb")
+		self._file.write(ScriptedController.FileHeader)
+		return self
+
+	def __exit__(self, *args):
+		self._file.close()
+		self._file = None
+		return self.controller.__exit__(*args)
+
+	def onButtonReleased(self, button, function):
+		self._onButton[2 * ButtonNames.index(button)] = function
+
+	def onButtonPressed(self, button, function):
+		self._onButton[2 * ButtonNames.index(button) + 1] = function
+
+	def _buttonEvent(self, i):
+		# Button i // 2 changed to i % 2
+		index = ScriptedController.Attributes.index(ButtonNames[i // 2])
+		def event():
+			self._write(index, i % 2)
+			self._onButton[i]()
+		return event
+
+	def _write(self, index, value):
+		self._values[index] = value
+		if self._file is not None:
+			self._file.write(ScriptedController.EventFormat.pack(self._now, index, value))
+			self.eventCount += 1
+
+	def update(self, now = 0, *args):
+		self._now = now
+		self.controller.update(now, *args)
+		for i, name in enumerate(ScriptedController.Attributes):
+			value = getattr(self.controller, name)
+			if value != self._values[i]:
+				self._write(i, value)
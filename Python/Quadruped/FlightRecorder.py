@@ -0,0 +1,82 @@
+import numpy as np
+from time import perf_counter
+from ControllerInputs import AxisNames, ButtonNames
+
+class FlightRecorder:
+	# Ring buffer of the last capacity control ticks of a Quadruped, preallocated as one NumPy
+	# structured array and written in place, so recording a tick allocates no arrays. Dumps are
+	# .npy files of the recorded ticks, oldest first, which np.load can memory-map. Fields:
+	#   time, timeStep:	control loop time and time since the last tick (s)
+	#   wallTime:		perf_counter at the end of the tick (s)
+	#   state:			run state machine state, 3 while walking
+	#   gait:			active gait index
+	#   axes:			controller sticks, triggers and D-pad, in the order of Axes
+	#   buttons:		controller buttons, bit i set if ControllerInputs.ButtonNames[i] is pressed
+	#   phase:			gait phase (cycles)
+	#   feet:			target foot positions (x, y, z rows, one column per leg, inches)
+	#   joints:			commanded joint angles, in the order of the legs' joints (degrees)
+	#   ikinIterations:	ikin steps per leg on the tick, or -1 if a leg wasn't solved
+	#   origami:		Origami Module motor positions, all 32 channels (counts)
+	Axes = AxisNames
+	Dtype = np.dtype([
+		('time', np.float64), ('timeStep', np.float64), ('wallTime', np.float64),
+		('state', np.int8), ('gait', np.int8), ('buttons', np.uint16),
+		('axes', np.float32, len(Axes)), ('phase', np.float64), ('feet', np.float32, (3, 4)),
+		('joints', np.float32, 12), ('ikinIterations', np.int16, 4), ('origami', np.int32, 32)])
+
+	def __init__(self, capacity = 10000):
+		self.capacity = capacity
+		self.buffer = np.zeros(capacity, dtype = FlightRecorder.Dtype)
+		self.count = 0
+		self._fields = {name: self.buffer[name] for name in FlightRecorder.Dtype.names}
+		self._positions = np.zeros(32, dtype = np.int64)
+
+	def record(self, robot, xbox, now, timeStep, state):
+		f = self._fields
+		i = self.count % self.capacity
+		f['time'][i] = now
+		f['timeStep'][i] = timeStep
+		f['state'][i] = state
+		f['gait'][i] = robot.activeGait
+
+		axes = f['axes'][i]
+		for j, name in enumerate(FlightRecorder.Axes):
+			axes[j] = getattr(xbox, name)
+		buttons = 0
+		for j, name in enumerate(ButtonNames):
+			if getattr(xbox, name):
+				buttons |= 1 << j
+		f['buttons'][i] = buttons
+
+		f['phase'][i] = robot.gaitPhase
+		f['feet'][i] = robot.footTargets
+		joints = f['joints'][i]
+		for j, servo in enumerate(robot._servos):
+			joints[j] = servo.angle
+		f['ikinIterations'][i] = robot.ikinIterations
+		robot.OrigamiController.getMotorPositions(out = self._positions)
+		f['origami'][i] = self._positions
+		f['wallTime'][i] = perf_counter()
+		self.count += 1
+
+	def ticks(self):
+		# The recorded ticks, oldest first, as a new array
+		if self.count <= self.capacity:
+			return self.buffer[:self.count].copy()
+		i = self.count % self.capacity
+		return np.concatenate((self.buffer[i:], self.buffer[:i]))
+
+	def dump(self, fileName):
+		# Writes the recorded ticks straight from the ring buffer into a memory-mapped .npy file
+		n = min(self.count, self.capacity)
+		i = self.count % self.capacity if self.count > self.capacity else 0
+		out = np.lib.format.open_memmap(fileName, mode = 'w+', dtype = FlightRecorder.Dtype, shape = (n,))
+		out[:n - i] = self.buffer[i:n]
+		out[n - i:] = self.buffer[:i]
+		out.flush()
+		del out
+		return fileName
+
+	@staticmethod
+	def load(fileName):
+		return np.load(fileName, mmap_mode = 'r')
@@ -0,0 +1,86 @@
+import numpy as np
+from PythonManipulator import jacobPoseBatch
+from Units import inch2meter, meter2inch, wrapAngle
+
+class IkinTable:
+	# Saved tables are a single (3 + nx*ny*nz, 3) array so that they can be memory-mapped.
+	# The first three rows hold the lower corner, the upper corner and the grid shape, and
+	# the remaining rows hold the joint solutions in C order over (x, y, z).
+	_headerRows = 3
+
+	def __init__(self, table, lower, upper):
+		self.table = table
+		self.lower = np.array(lower, dtype = np.float64)
+		self.upper = np.array(upper, dtype = np.float64)
+		self.shape = np.array(table.shape[:3])
+		self._scale = (self.shape - 1) / (self.upper - self.lower)
+		self._maxIndex = self.shape - 2
+
+	@staticmethod
+	def build(leg, lower = (-4, -5, -1.5), upper = (4, 5, 6), resolution = 0.25, tol = 1e-4):
+		# The box is given in inches relative to the leg's home position, and is stored in meters.
+		# Joint angles are wrapped into [-pi, pi), which keeps them continuous over the leg's
+		# reachable workspace, and cells the solver couldn't reach within tol are filled from
+		# their reachable neighbours, so interpolation next to the boundary still gives good seeds.
+		axes = [inch2meter(np.arange(lo, hi + 0.5 * resolution, resolution) + home) for lo, hi, home in zip(lower, upper, leg.Home)]
+		P = np.stack(np.meshgrid(*axes, indexing = 'ij'), axis = -1).reshape(-1, 3)
+
+		Q0 = np.empty((len(P), 3))
+		for i, p in enumerate(P):
+			q = leg.ikinAnalytic(p)
+			Q0[i] = q if q is not None else (0, *leg.pose2D(meter2inch(p[1]), meter2inch(p[2])))
+		Q = wrapAngle(leg.manip.ikinBatch(P, Q0))
+
+		_, T = jacobPoseBatch(leg.manip.S, Q, leg.manip.N)
+		reached = np.linalg.norm(T[:, :, 3] + T[:, :, :3] @ leg.manip.Home[3::4] - P, axis = 1) < tol
+
+		shape = [len(a) for a in axes]
+		table = Q.reshape(*shape, 3)
+		fillUnreached(table, reached.reshape(shape))
+		return IkinTable(table, [a[0] for a in axes], [a[-1] for a in axes])
+
+	@staticmethod
+	def load(fileName):
+		data = np.load(fileName, mmap_mode = 'r')
+		shape = data[2].astype(int)
+		return IkinTable(data[IkinTable._headerRows:].reshape(*shape, 3), data[0], data[1])
+
+	def save(self, fileName):
+		data = np.lib.format.open_memmap(fileName, mode = 'w+', dtype = np.float64, shape = (IkinTable._headerRows + self.table[..., 0].size, 3))
+		data[0] = self.lower
+		data[1] = self.upper
+		data[2] = self.shape
+		data[IkinTable._headerRows:] = self.table.reshape(-1, 3)
+		data.flush()
+
+	def lookup(self, p):
+		# Trilinear interpolation of the joint solution at p (meters), or None outside the box
+		u = (np.asarray(p) - self.lower) * self._scale
+		if (u < 0).any() or (u > self._maxIndex + 1).any():
+			return None
+		i = np.minimum(u.astype(int), self._maxIndex)
+		f = u - i
+		c = self.table[i[0]:i[0]+2, i[1]:i[1]+2, i[2]:i[2]+2]
+		c = c[0] + f[0] * (c[1] - c[0])
+		c = c[0] + f[1] * (c[1] - c[0])
+		return c[0] + f[2] * (c[1] - c[0])
+
+def fillUnreached(table, reached):
+	# Fills the cells that aren't reached, one layer at a time outward from those that are, with
+	# the mean of their already filled face neighbours
+	filled = reached.copy()
+	while not filled.all():
+		count = np.zeros(filled.shape)
+		total = np.zeros(table.shape)
+		paddedFilled = np.pad(filled, 1)
+		paddedTable = np.pad(np.where(filled[..., None], table, 0), ((1, 1), (1, 1), (1, 1), (0, 0)))
+		for axis in range(3):
+			for offset in (0, 2):
+				index = tuple(slice(offset, offset + n) if a == axis else slice(1, 1 + n) for a, n in enumerate(filled.shape))
+				count += paddedFilled[index]
+				total += paddedTable[index]
+		grow = ~filled & (count > 0)
+		if not grow.any():
+			break
+		table[grow] = total[grow] / count[grow][:, None]
+		filled |= grow
@@ -0,0 +1,81 @@
+import numpy as np
+from time import perf_counter
+from threading import Thread, Event
+
+class DoubleBuffer:
+	# Single-producer, single-consumer command buffer. The producer fills the back buffer and
+	# publishes it by flipping the front index, so publishing never takes a lock. Copying a
+	# small array in or out is a single NumPy call that holds the GIL, so neither side can
+	# observe a half-written buffer.
+	def __init__(self, size):
+		self._buffers = (np.zeros(size), np.zeros(size))
+		self._front = 0
+		self.sequence = 0
+
+	def publish(self, values):
+		back = 1 - self._front
+		self._buffers[back][:] = values
+		self._front = back
+		self.sequence += 1
+
+	def read(self, out):
+		sequence = self.sequence
+		out[:] = self._buffers[self._front]
+		return sequence
+
+class IoWorker(Thread):
+	# Runs flush on a dedicated thread whenever notified, and at least once per period if a
+	# period is given. With a buffer, flush receives the latest published values and only runs
+	# when something new has been published.
+	def __init__(self, name, flush, buffer = None, period = None):
+		super().__init__(name = name, daemon = True)
+		self._flush = flush
+		self.buffer = buffer
+		self.period = period
+		self._values = None if buffer is None else np.zeros_like(buffer._buffers[0])
+		self._wake = Event()
+		self._running = False
+		self.flushCount = 0
+		self.flushTime = 0
+		self.error = None
+
+	def start(self):
+		self._running = True
+		super().start()
+
+	def stop(self):
+		self._running = False
+		self._wake.set()
+		if self.is_alive():
+			self.join()
+
+	def notify(self):
+		self._wake.set()
+
+	def run(self):
+		sequence = -1
+		while self._running:
+			self._wake.wait(self.period)
+			self._wake.clear()
+			if not self._running:
+				break
+
+			tic = perf_counter()
+			try:
+				if self.buffer is None:
+					self._flush()
+				else:
+					latest = self.buffer.read(self._values)
+					if latest == sequence:
+						continue
+					sequence = latest
+					self._flush(self._values)
+			except Exception as e:
+				if self.error is None:
+					print(f"\nWARNING: {self.name} I/O worker error: {e!r}. Continuing.")
+				self.error = e
+			self.flushCount += 1
+			self.flushTime = 0.99 * self.flushTime + 0.01 * (perf_counter() - tic)
+
+	def stateString(self):
+		return f"\n  {self.name} Worker:\t\t{self.flushCount} flushes, {1000 * self.flushTime:.3f} ms per flush"
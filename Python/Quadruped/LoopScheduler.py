@@ -0,0 +1,63 @@
+from time import perf_counter, sleep
+
+class LoopScheduler:
+	Stages = ('controller', 'gait', 'ik', 'servo', 'usb', 'webots')
+
+	def __init__(self, rate = 100, stages = Stages):
+		self.rate = rate
+		self.period = 1 / rate
+		self.stageTimes = dict.fromkeys(stages, 0.0)
+		self._tickTimes = dict.fromkeys(stages, 0.0)
+		self.reset()
+
+	def reset(self):
+		self.ticks = 0
+		self.overruns = 0
+		self.skippedTicks = 0
+		self.measuredPeriod = self.period
+		self.idleTime = 0
+		self.startTime = perf_counter()
+		self._deadline = self.startTime
+		self._wakeTime = self.startTime
+		self._lapTime = self.startTime
+
+	def wait(self):
+		# Sleeps until the next absolute deadline, so that timing errors don't accumulate.
+		# Returns the nominal time of the new tick and the measured time since the last one.
+		for stage, t in self._tickTimes.items():
+			self.stageTimes[stage] = 0.99 * self.stageTimes[stage] + 0.01 * t
+			self._tickTimes[stage] = 0.0
+
+		self._deadline += self.period
+		now = perf_counter()
+		if now > self._deadline:
+			self.overruns += 1
+			# When more than a whole period late, drop the missed ticks rather than
+			# running a burst of them back to back.
+			missed = int((now - self._deadline) / self.period)
+			self._deadline += missed * self.period
+			self.skippedTicks += missed
+			idle = 0
+		else:
+			idle = self._deadline - now
+			sleep(idle)
+
+		now = perf_counter()
+		timeStep = now - self._wakeTime
+		self._wakeTime = now
+		self._lapTime = now
+		self.ticks += 1
+		self.measuredPeriod = 0.99 * self.measuredPeriod + 0.01 * timeStep
+		self.idleTime = 0.99 * self.idleTime + 0.01 * idle
+		return self._deadline - self.startTime, timeStep
+
+	def lap(self, stage):
+		now = perf_counter()
+		self._tickTimes[stage] += now - self._lapTime
+		self._lapTime = now
+
+	def stateString(self):
+		return (f"\n  Scheduler Target Rate:\t{self.rate:.2f} Hz"
+			f"\n  Scheduler Overruns:\t\t{self.overruns} of {self.ticks} ticks ({self.skippedTicks} skipped)"
+			f"\n  Scheduler Idle Time:\t\t{1000 * self.idleTime:.3f} ms"
+			f"\n  Stage Times:\t\t\t{', '.join(f'{stage} {1000 * t:.3f} ms' for stage, t in self.stageTimes.items())}")
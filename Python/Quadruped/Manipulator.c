@@ -0,0 +1,466 @@
+#include <math.h>
+#include <string.h>
+
+#ifdef _WIN32
+#define EXPORT __declspec(dllexport)
+#else
+#define EXPORT
+#endif
+
+/*
+	Kinematics and dynamics core, built by BuildManipulator.py and loaded by Manipulator.py.
+	The kinematics functions mirror the scalar functions in PythonManipulator.py operation for
+	operation, and the dynamics mirror the vectorized Newton-Euler functions there.
+
+	The manipulator buffer holds S (6n), G (6n), M (12n) and Home (12), where poses are 3x4
+	row-major homogeneous transforms and twists are [w, v].
+
+	Scratch space is on the stack, sized for at most MAX_JOINTS joints, so no call allocates.
+	Entry points leave their outputs unchanged for larger n, and ikin returns -1.
+*/
+
+#define GRAVITY 9.81
+#define MAX_JOINTS 16
+
+static int ikina(const double* S, const double* M, int n, const double* p, double tol, double k, int maxSteps, double* q);
+static void jacobPose(const double* S, const double* q, int n, double* J, double* T);
+static void htMul(const double* Ta, const double* Tb, double* Tp);
+static void adjoint(const double* T, const double* Va, double* Vb);
+static void tw2ht(const double* V, double theta, double* T);
+static void chol(double* L, int n);
+static void cholSolve(const double* L, const double* b, int n, double* x);
+
+static void massBias(const double* S, const double* G, const double* M, int n, const double* q, const double* dq, double* Mq, double* h);
+static void adjointTranspose(const double* T, const double* Fa, double* Fb);
+static void ad(const double* V, const double* X, double* Y);
+static void adTranspose(const double* V, const double* F, double* Y);
+static void htInv(const double* T, double* Ti);
+static void cross(const double* a, const double* b, double* c);
+
+EXPORT int ikin(double* manip, int n, double* p, double* q)
+{
+	if (n > MAX_JOINTS)
+		return -1;
+	return ikina(manip, manip + 24*n, n, p, 1e-4, 20e-3, 100, q);
+}
+
+EXPORT void ikinBatch(double* manip, int n, double* P, double* Q, int count)
+{
+	// Solves each row of P (count x 3) into the same row of Q (count x n), starting from it
+	int i;
+
+	if (n > MAX_JOINTS)
+		return;
+	for (i = 0; i < count; i++)
+		ikina(manip, manip + 24*n, n, P + 3*i, 1e-4, 20e-3, 100, Q + n*i);
+}
+
+EXPORT void fkin(double* manip, int n, double* q, double* p)
+{
+	// Transforms the point p[i] in the frame of joint i into the space frame, for each joint
+	double T[12], temp[12], x, y, z;
+	int i;
+
+	for (i = 0; i < n; i++)
+	{
+		if (i == 0)
+			tw2ht(manip, q[0], T);
+		else
+		{
+			tw2ht(manip + 6*i, q[i], temp);
+			htMul(T, temp, T);
+		}
+
+		x = p[3*i];
+		y = p[3*i+1];
+		z = p[3*i+2];
+		p[3*i] = T[0] * x + T[1] * y + T[2] * z + T[3];
+		p[3*i+1] = T[4] * x + T[5] * y + T[6] * z + T[7];
+		p[3*i+2] = T[8] * x + T[9] * y + T[10] * z + T[11];
+	}
+}
+
+EXPORT void simStep(double* manip, int n, double dt, double* u, double* qdq)
+{
+	// Semi-implicit Euler step of M(q) * ddq + h(q, dq) = u
+	double Mq[MAX_JOINTS * MAX_JOINTS], h[MAX_JOINTS], ddq[MAX_JOINTS];
+	double* q = qdq;
+	double* dq = qdq + n;
+	int i;
+
+	if (n > MAX_JOINTS)
+		return;
+	massBias(manip, manip + 6*n, manip + 12*n, n, q, dq, Mq, h);
+
+	for (i = 0; i < n; i++)
+		h[i] = u[i] - h[i];
+	chol(Mq, n);
+	cholSolve(Mq, h, n, ddq);
+
+	for (i = 0; i < n; i++)
+	{
+		dq[i] += ddq[i] * dt;
+		q[i] += dq[i] * dt;
+	}
+}
+
+static int ikina(const double* S, const double* M, int n, const double* p, double tol, double k, int maxSteps, double* q)
+{
+	double J[6 * MAX_JOINTS] = {0};
+	double T[12] = {0}, L[9] = {0}, e[3];
+	int step, i;
+
+	tol *= tol;
+
+	for (step = 0; step < maxSteps; step++)
+	{
+		// Calculate Jacobian and Pose
+		jacobPose(S, q, n, J, T);
+
+		T[3] += T[0] * M[3] + T[1] * M[7] + T[2] * M[11];
+		T[7] += T[4] * M[3] + T[5] * M[7] + T[6] * M[11];
+		T[11] += T[8] * M[3] + T[9] * M[7] + T[10] * M[11];
+
+		// Calculate Position Error
+		e[0] = p[0] - T[3];
+		e[1] = p[1] - T[7];
+		e[2] = p[2] - T[11];
+
+		// Check Position Error Tolerance
+		if (e[0] * e[0] + e[1] * e[1] + e[2] * e[2] < tol)
+			break;
+
+		// Calculate Analytical Jacobian
+		J[3] = S[3] + T[11] * S[1] - T[7] * S[2];
+		J[4] = S[4] + T[3] * S[2] - T[11] * S[0];
+		J[5] = S[5] + T[7] * S[0] - T[3] * S[1];
+
+		// L = Ja * Ja' + lambda * I
+		L[0] = J[3] * J[3] + k;
+		L[1] = J[3] * J[4];
+		L[2] = J[3] * J[5];
+		L[4] = J[4] * J[4] + k;
+		L[5] = J[4] * J[5];
+		L[8] = J[5] * J[5] + k;
+
+		for (i = 1; i < n; i++)
+		{
+			J[6*i+3] += T[11] * J[6*i+1] - T[7] * J[6*i+2];
+			J[6*i+4] += T[3] * J[6*i+2] - T[11] * J[6*i];
+			J[6*i+5] += T[7] * J[6*i] - T[3] * J[6*i+1];
+
+			L[0] += J[6*i+3] * J[6*i+3];
+			L[1] += J[6*i+3] * J[6*i+4];
+			L[2] += J[6*i+3] * J[6*i+5];
+			L[4] += J[6*i+4] * J[6*i+4];
+			L[5] += J[6*i+4] * J[6*i+5];
+			L[8] += J[6*i+5] * J[6*i+5];
+		}
+
+		// q += J' * ((J * J' + lambda * I) \ e)
+		chol(L, 3);
+		cholSolve(L, e, 3, e);
+
+		for (i = 0; i < n; i++)
+			q[i] += J[6*i+3] * e[0] + J[6*i+4] * e[1] + J[6*i+5] * e[2];
+	}
+
+	return step;
+}
+
+static void jacobPose(const double* S, const double* q, int n, double* J, double* T)
+{
+	double temp[12];
+	int i;
+
+	tw2ht(S, q[0], T);
+	for (i = 1; i < n; i++)
+	{
+		adjoint(T, S + 6*i, J + 6*i);
+		tw2ht(S + 6*i, q[i], temp);
+		htMul(T, temp, T);
+	}
+}
+
+static void htMul(const double* Ta, const double* Tb, double* Tp)
+{
+	double c0, c1, c2, c3;
+	int r;
+
+	for (r = 0; r < 12; r += 4)
+	{
+		c0 = Ta[r] * Tb[0] + Ta[r+1] * Tb[4] + Ta[r+2] * Tb[8];
+		c1 = Ta[r] * Tb[1] + Ta[r+1] * Tb[5] + Ta[r+2] * Tb[9];
+		c2 = Ta[r] * Tb[2] + Ta[r+1] * Tb[6] + Ta[r+2] * Tb[10];
+		c3 = Ta[r] * Tb[3] + Ta[r+1] * Tb[7] + Ta[r+2] * Tb[11] + Ta[r+3];
+		Tp[r] = c0;
+		Tp[r+1] = c1;
+		Tp[r+2] = c2;
+		Tp[r+3] = c3;
+	}
+}
+
+static void adjoint(const double* T, const double* Va, double* Vb)
+{
+	double v0 = Va[0];
+	double v1 = Va[1];
+	double v2 = Va[2];
+
+	double v3 = (T[0] * Va[3] + T[1] * Va[4] + T[2] * Va[5]
+		+ (T[7] * T[8] - T[11] * T[4]) * v0
+		+ (T[7] * T[9] - T[11] * T[5]) * v1
+		+ (T[7] * T[10] - T[11] * T[6]) * v2);
+
+	double v4 = (T[4] * Va[3] + T[5] * Va[4] + T[6] * Va[5]
+		+ (T[11] * T[0] - T[3] * T[8]) * v0
+		+ (T[11] * T[1] - T[3] * T[9]) * v1
+		+ (T[11] * T[2] - T[3] * T[10]) * v2);
+
+	double v5 = (T[8] * Va[3] + T[9] * Va[4] + T[10] * Va[5]
+		+ (T[3] * T[4] - T[7] * T[0]) * v0
+		+ (T[3] * T[5] - T[7] * T[1]) * v1
+		+ (T[3] * T[6] - T[7] * T[2]) * v2);
+
+	Vb[0] = T[0] * v0 + T[1] * v1 + T[2] * v2;
+	Vb[1] = T[4] * v0 + T[5] * v1 + T[6] * v2;
+	Vb[2] = T[8] * v0 + T[9] * v1 + T[10] * v2;
+	Vb[3] = v3;
+	Vb[4] = v4;
+	Vb[5] = v5;
+}
+
+static void tw2ht(const double* V, double theta, double* T)
+{
+	double s = sin(theta);
+	double c = 1.0 - cos(theta);
+
+	double a = theta - s;
+
+	double s0 = s * V[0];
+	double s1 = s * V[1];
+	double s2 = s * V[2];
+	double c0 = c * V[0];
+	double c1 = c * V[1];
+	double c2 = c * V[2];
+
+	double v0 = V[0] * V[0];
+	double v1 = V[1] * V[1];
+	double v2 = V[2] * V[2];
+
+	double w00 = v1 + v2;
+	double w11 = v0 + v2;
+	double w22 = v0 + v1;
+	double w01 = V[0] * V[1];
+	double w02 = V[0] * V[2];
+	double w12 = V[1] * V[2];
+
+	// R = eye(3) + s(theta) * w + (1 - c(theta)) * w * w
+	v0 = c * w01;
+	v1 = c * w02;
+	v2 = c * w12;
+
+	T[0] = 1.0 - c * w00;
+	T[5] = 1.0 - c * w11;
+	T[10] = 1.0 - c * w22;
+
+	T[4] = v0 + s2;
+	T[8] = v1 - s1;
+	T[9] = v2 + s0;
+
+	T[1] = v0 - s2;
+	T[2] = v1 + s1;
+	T[6] = v2 - s0;
+
+	// p = (theta * eye(3) + (1 - c(theta)) * w + (theta - s(theta)) * w * w) * V[3:5]
+	w00 *= a;
+	w11 *= a;
+	w22 *= a;
+	w01 *= a;
+	w02 *= a;
+	w12 *= a;
+
+	T[3] = (theta - w00) * V[3] + (w01 - c2) * V[4] + (w02 + c1) * V[5];
+	T[7] = (w01 + c2) * V[3] + (theta - w11) * V[4] + (w12 - c0) * V[5];
+	T[11] = (w02 - c1) * V[3] + (w12 + c0) * V[4] + (theta - w22) * V[5];
+}
+
+static void chol(double* L, int n)
+{
+	double sum;
+	int i, j, k;
+
+	for (i = 0; i < n; i++)
+	{
+		sum = L[n*i+i];
+		for (k = i - 1; k >= 0; k--)
+			sum -= L[n*i+k] * L[n*i+k];
+		L[n*i+i] = sqrt(sum);
+		for (j = i + 1; j < n; j++)
+		{
+			sum = L[n*i+j];
+			for (k = i - 1; k >= 0; k--)
+				sum -= L[n*i+k] * L[n*j+k];
+			L[n*j+i] = sum / L[n*i+i];
+		}
+	}
+}
+
+static void cholSolve(const double* L, const double* b, int n, double* x)
+{
+	double sum;
+	int i, k;
+
+	for (i = 0; i < n; i++)
+	{
+		sum = b[i];
+		for (k = i - 1; k >= 0; k--)
+			sum -= L[n * i + k] * x[k];
+		x[i] = sum / L[n * i + i];
+	}
+	for (i = n - 1; i >= 0; i--)
+	{
+		sum = x[i];
+		for (k = i + 1; k < n; k++)
+			sum -= L[n * k + i] * x[k];
+		x[i] = sum / L[n * i + i];
+	}
+}
+
+static void massBias(const double* S, const double* G, const double* M, int n, const double* q, const double* dq, double* Mq, double* h)
+{
+	// Case 0 evaluates the bias forces h(q, dq) including gravity, and case c > 0 evaluates
+	// column c-1 of the mass matrix, each with one Newton-Euler pass.
+	double A[6 * MAX_JOINTS], T[12 * MAX_JOINTS], V[6 * MAX_JOINTS], dV[6 * MAX_JOINTS];
+	double Minv[12], Mrel[12], temp[12], Vi[6], dVi[6], F[6], t[6], a[6], tau;
+	int c, i, j;
+
+	// Screw axes in the link frames, and the transforms from each link frame to the next
+	for (i = 0; i < n; i++)
+	{
+		htInv(M + 12*i, Minv);
+		adjoint(Minv, S + 6*i, A + 6*i);
+		if (i == 0)
+			memcpy(Mrel, Minv, sizeof(Mrel));
+		else
+			htMul(Minv, M + 12*(i-1), Mrel);
+		for (j = 0; j < 6; j++)
+			t[j] = A[6*i+j];
+		tw2ht(t, -q[i], temp);
+		htMul(temp, Mrel, T + 12*i);
+	}
+
+	for (c = 0; c <= n; c++)
+	{
+		// Forward pass: link twists and accelerations
+		memset(Vi, 0, sizeof(Vi));
+		memset(dVi, 0, sizeof(dVi));
+		if (c == 0)
+			dVi[5] = GRAVITY;
+		for (i = 0; i < n; i++)
+		{
+			double dqi = c == 0 ? dq[i] : 0;
+			double ddqi = c == i + 1 ? 1 : 0;
+
+			adjoint(T + 12*i, Vi, t);
+			for (j = 0; j < 6; j++)
+				Vi[j] = t[j] + A[6*i+j] * dqi;
+
+			adjoint(T + 12*i, dVi, t);
+			ad(Vi, A + 6*i, a);
+			for (j = 0; j < 6; j++)
+				dVi[j] = t[j] + a[j] * dqi + A[6*i+j] * ddqi;
+
+			memcpy(V + 6*i, Vi, sizeof(Vi));
+			memcpy(dV + 6*i, dVi, sizeof(dVi));
+		}
+
+		// Backward pass: link wrenches and joint torques
+		memset(F, 0, sizeof(F));
+		for (i = n - 1; i >= 0; i--)
+		{
+			if (i < n - 1)
+			{
+				adjointTranspose(T + 12*(i+1), F, t);
+				memcpy(F, t, sizeof(F));
+			}
+			for (j = 0; j < 6; j++)
+				a[j] = G[6*i+j] * V[6*i+j];
+			adTranspose(V + 6*i, a, t);
+			tau = 0;
+			for (j = 0; j < 6; j++)
+			{
+				F[j] += G[6*i+j] * dV[6*i+j] - t[j];
+				tau += F[j] * A[6*i+j];
+			}
+			if (c == 0)
+				h[i] = tau;
+			else
+				Mq[n*i + c-1] = tau;
+		}
+	}
+}
+
+static void adjointTranspose(const double* T, const double* Fa, double* Fb)
+{
+	// Fb = Ad(T)' * Fa
+	double w0 = Fa[0] - (T[7] * Fa[5] - T[11] * Fa[4]);
+	double w1 = Fa[1] - (T[11] * Fa[3] - T[3] * Fa[5]);
+	double w2 = Fa[2] - (T[3] * Fa[4] - T[7] * Fa[3]);
+
+	Fb[0] = T[0] * w0 + T[4] * w1 + T[8] * w2;
+	Fb[1] = T[1] * w0 + T[5] * w1 + T[9] * w2;
+	Fb[2] = T[2] * w0 + T[6] * w1 + T[10] * w2;
+	Fb[3] = T[0] * Fa[3] + T[4] * Fa[4] + T[8] * Fa[5];
+	Fb[4] = T[1] * Fa[3] + T[5] * Fa[4] + T[9] * Fa[5];
+	Fb[5] = T[2] * Fa[3] + T[6] * Fa[4] + T[10] * Fa[5];
+}
+
+static void ad(const double* V, const double* X, double* Y)
+{
+	// Y = [V] * X
+	double t[3];
+	cross(V, X, Y);
+	cross(V + 3, X, Y + 3);
+	cross(V, X + 3, t);
+	Y[3] += t[0];
+	Y[4] += t[1];
+	Y[5] += t[2];
+}
+
+static void adTranspose(const double* V, const double* F, double* Y)
+{
+	// Y = [V]' * F
+	double t[3];
+	cross(V, F, Y);
+	cross(V + 3, F + 3, t);
+	Y[0] = -Y[0] - t[0];
+	Y[1] = -Y[1] - t[1];
+	Y[2] = -Y[2] - t[2];
+	cross(V, F + 3, Y + 3);
+	Y[3] = -Y[3];
+	Y[4] = -Y[4];
+	Y[5] = -Y[5];
+}
+
+static void htInv(const double* T, double* Ti)
+{
+	Ti[0] = T[0];
+	Ti[1] = T[4];
+	Ti[2] = T[8];
+	Ti[4] = T[1];
+	Ti[5] = T[5];
+	Ti[6] = T[9];
+	Ti[8] = T[2];
+	Ti[9] = T[6];
+	Ti[10] = T[10];
+	Ti[3] = -(Ti[0] * T[3] + Ti[1] * T[7] + Ti[2] * T[11]);
+	Ti[7] = -(Ti[4] * T[3] + Ti[5] * T[7] + Ti[6] * T[11]);
+	Ti[11] = -(Ti[8] * T[3] + Ti[9] * T[7] + Ti[10] * T[11]);
+}
+
+static void cross(const double* a, const double* b, double* c)
+{
+	c[0] = a[1] * b[2] - a[2] * b[1];
+	c[1] = a[2] * b[0] - a[0] * b[2];
+	c[2] = a[0] * b[1] - a[1] * b[0];
+}
@@ -1,49 +1,177 @@
 
 import numpy as np
+from math import sqrt
 from sys import platform
 from os.path import dirname, realpath
 from ctypes import *
+from PythonManipulator import ikinlm, endPose, PoseCache
+from Profiler import profiled
 
 class Manipulator:
-	try:
-		_manipulatorDll = CDLL(f"{dirname(dirname(realpath(__file__)))}/lib/Manipulator.{'dll' if platform == 'win32' else 'so'}")
-		_manipulatorDll.ikin.argtypes = [POINTER(c_double), c_int, POINTER(c_double), POINTER(c_double)]
-		_manipulatorDll.ikin.restype = None
-		_manipulatorDll.simStep.argtypes = [POINTER(c_double), c_int, c_double, POINTER(c_double), POINTER(c_double)]
-		_manipulatorDll.simStep.restype = None
-		_manipulatorDll.fkin.argtypes = [POINTER(c_double), c_int, POINTER(c_double), POINTER(c_double)]
-		_manipulatorDll.fkin.restype = None
-	except:
-		print("\nWARNING: Unable to load Manipulator DLL. Continuing with Python implementation.")
-		from PythonManipulator import PythonManipulator as _manipulatorDll
+	_manipulatorDll = None
+
+	@staticmethod
+	def loadLibrary():
+		# The kinematics library is loaded when the first Manipulator needs it rather than on
+		# import, so programs that only pass their own backends never load or build it.
+		if Manipulator._manipulatorDll is None:
+			Manipulator._manipulatorDll = Manipulator._openLibrary()
+		return Manipulator._manipulatorDll
+
+	@staticmethod
+	def _openLibrary():
+		try:
+			try:
+				dll = CDLL(f"{dirname(dirname(realpath(__file__)))}/lib/Manipulator.{'dll' if platform == 'win32' else 'so'}")
+				dll.ikin.restype = None
+			except OSError:
+				# Without an installed library, build one from Manipulator.c. Its ikin also
+				# returns the number of steps taken.
+				from BuildManipulator import build
+				dll = CDLL(build())
+				dll.ikin.restype = c_int
+			dll.ikin.argtypes = [POINTER(c_double), c_int, POINTER(c_double), POINTER(c_double)]
+			if hasattr(dll, "ikinBatch"):
+				dll.ikinBatch.argtypes = [POINTER(c_double), c_int, POINTER(c_double), POINTER(c_double), c_int]
+				dll.ikinBatch.restype = None
+			dll.simStep.argtypes = [POINTER(c_double), c_int, c_double, POINTER(c_double), POINTER(c_double)]
+			dll.simStep.restype = None
+			dll.fkin.argtypes = [POINTER(c_double), c_int, POINTER(c_double), POINTER(c_double)]
+			dll.fkin.restype = None
+			return dll
+		except:
+			try:
+				from NumbaManipulator import NumbaManipulator
+				print("\nWARNING: Unable to load Manipulator DLL. Continuing with Numba implementation.")
+				return NumbaManipulator
+			except ImportError:
+				print("\nWARNING: Unable to load Manipulator DLL. Continuing with Python implementation.")
+				from PythonManipulator import PythonManipulator
+				return PythonManipulator
 
 	default_S = [0, 0, 1, 0, 0, 0]
 	default_M = [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0]
 	default_G = [0] * 6
 
-	def __init__(self):
+	SOLVER_DLS = 0
+	SOLVER_LM = 1
+
+	# Joint limit of the kinematics library, MAX_JOINTS in Manipulator.c
+	MAX_JOINTS = 16
+
+	def __init__(self, backend = None):
+		# The backend is the kinematics library by default, or any object with the same
+		# ikin, fkin and simStep entry points, such as PythonManipulator.
+		self._backend = Manipulator.loadLibrary() if backend is None else backend
+		self._native = isinstance(self._backend, CDLL)
 		self.N = 0
-		self.S = []
-		self.M = []
-		self.G = []
-		self.Home = Manipulator.default_M
-		manip = self.S + self.G + self.M + self.Home
-		self._cManip = (c_double*len(manip))(*manip)
-		self._cN = c_int(self.N)
+		self.ikinIterations = None
+		self.reuseTargetTolerance = 0
+		self.reuseJointTolerance = 0
+		self._allocate()
+
+	# The model (S, G, M and Home) lives in one contiguous buffer laid out the way the
+	# kinematics library expects it, and S, G, M and Home are views into that buffer.
+	# Scratch buffers for every library call are allocated here as well, so library calls do
+	# no allocation. ikin, simStep and fkin return new arrays, or with out, write their result
+	# into out instead and allocate nothing.
+	def _allocate(self, S = (), G = (), M = (), Home = default_M):
+		n = self.N
+		self._manip = np.zeros(24*n + 12)
+		self._S = self._manip[: 6*n].reshape(n, 6)
+		self._G = self._manip[6*n: 12*n].reshape(n, 6)
+		self._M = self._manip[12*n: 24*n].reshape(n, 12)
+		self._Home = self._manip[24*n:]
+		self._S[:] = np.reshape(S, (n, 6))
+		self._G[:] = np.reshape(G, (n, 6))
+		self._M[:] = np.reshape(M, (n, 12))
+		self._Home[:] = Home
+
+		# The ikin target and initial guess are adjacent, so a request can be compared as bytes
+		self._request = np.zeros(3 + n)
+		self._p = self._request[:3]
+		self._q = self._request[3:]
+		self._qdq = np.zeros(2*n)
+		self._u = np.zeros(n)
+		self._fkinP = np.zeros(3*n)
+		self._fkinQ = np.zeros(n)
+
+		self._cManip = self._pointer(self._manip)
+		self._cP = self._pointer(self._p)
+		self._cQ = self._pointer(self._q)
+		self._cQdq = self._pointer(self._qdq)
+		self._cU = self._pointer(self._u)
+		self._cFkinP = self._pointer(self._fkinP)
+		self._cFkinQ = self._pointer(self._fkinQ)
+		self._cN = c_int(n)
+		self._cDt = c_double(0)
+
+		# Prefix transforms and Jacobian columns of the last pose evaluated by the LM solver or
+		# for a residual, and the last ikin request and result. The default DLS solver runs in
+		# the backend and gets no benefit from the pose cache, only from reused results. The
+		# views can be written in place, so reading S, G, M or Home marks the model as changed,
+		# and the next ikin drops both. Views kept across ikin calls aren't tracked.
+		self.poseCache = PoseCache(n)
+		self._lastQ = np.zeros(n)
+		self._lastSolve = None
+		self._modelChanged = False
+
+	@property
+	def S(self):
+		self._modelChanged = True
+		return self._S
+
+	@property
+	def G(self):
+		self._modelChanged = True
+		return self._G
+
+	@property
+	def M(self):
+		self._modelChanged = True
+		return self._M
+
+	@property
+	def Home(self):
+		self._modelChanged = True
+		return self._Home
+
+	# Only the model is pickled, so that manipulators can be sent to worker processes. The
+	# library is loaded again when unpickling, and other backends are pickled by reference.
+	def __getstate__(self):
+		return {
+			"backend": None if self._native else self._backend,
+			"S": self._S.copy(),
+			"G": self._G.copy(),
+			"M": self._M.copy(),
+			"Home": self._Home.copy(),
+			"reuseTargetTolerance": self.reuseTargetTolerance,
+			"reuseJointTolerance": self.reuseJointTolerance}
+
+	def __setstate__(self, state):
+		self.__init__(state["backend"])
+		self.N = len(state["S"])
+		self._allocate(state["S"], state["G"], state["M"], state["Home"])
+		self.reuseTargetTolerance = state["reuseTargetTolerance"]
+		self.reuseJointTolerance = state["reuseJointTolerance"]
+
+	def _pointer(self, a):
+		return a.ctypes.data_as(POINTER(c_double)) if self._native else a
 
 	def addRevoluteDH(self, d = 0, theta = 0, r = 0, alpha = 0, M = default_M, G = default_G):
-		w = [self.Home[2], self.Home[6], self.Home[10]]
-		p = [self.Home[3], self.Home[7], self.Home[11]]
-		S = w + list(np.cross(p, w))
-		self.Home = np.matmul(self.Home, dh2ht(d, theta, r, alpha))
-		self.addRevoluteJoint(S, M, G)
+		w = self.Home[2::4]
+		p = self.Home[3::4]
+		S = list(w) + list(np.cross(p, w))
+		Home = np.matmul(np.vstack((self.Home.reshape(3, 4), [0, 0, 0, 1])), dh2ht(d, theta, r, alpha))
+		self.addJoint(S, M, G)
+		self.setHome(Home[:3].ravel())
 
 	def addPrismatic(self, v = [0, 0, 1], M = default_M, G = default_G):
 		if len(v) != 3:
 			raise ValueError("Manipulator Argument Length Error: v must contain 3 elements.")
 		elif abs(np.dot(v, v) - 1) > 1e-6:
 			raise ValueError("Manipulator Argument Length Error: v must be a unit vector.")
-		self.addJoint([0, 0, 0] + v, M, G)
+		self.addJoint([0, 0, 0] + list(v), M, G)
 
 	def addRevolute(self, w = [0, 0, 1], p = [0, 0, 0], M = default_M, G = default_G):
 		if len(w) != 3:
@@ -53,10 +181,8 @@ class Manipulator:
 		elif len(p) != 3:
 			raise ValueError("Manipulator Argument Length Error: p must contain 3 elements.")
 		else:
-			self.Home[3] = p[0]
-			self.Home[7] = p[1]
-			self.Home[11] = p[2]
-			self.addJoint(w + list(np.cross(p, w)), M, G)
+			self.Home[3::4] = p
+			self.addJoint(list(w) + list(np.cross(p, w)), M, G)
 
 	def addJoint(self, S = default_S, M = default_M, G = default_G):
 		if len(S) != 6:
@@ -65,37 +191,105 @@ class Manipulator:
 			raise ValueError("Manipulator Argument Length Error: M must contain 12 elements.")
 		elif len(G) != 6:
 			raise ValueError("Manipulator Argument Length Error: G must contain 6 elements.")
+		elif self._native and self.N >= Manipulator.MAX_JOINTS:
+			raise ValueError(f"Manipulator Joint Count Error: The kinematics library supports at most {Manipulator.MAX_JOINTS} joints.")
 		else:
 			self.N += 1
-			self.S += S
-			self.M += M
-			self.G += G
-			manip = self.S + self.G + self.M + self.Home
-			self._cManip = (c_double*len(manip))(*manip)
-			self._cN = c_int(self.N)
+			self._allocate(
+				np.vstack((self.S, S)),
+				np.vstack((self.G, G)),
+				np.vstack((self.M, M)),
+				self.Home.copy())
 
 	def setHome(self, M):
 		if len(M) == 3:
-			self.Home = [1, 0, 0, M[0], 0, 1, 0, M[1], 0, 0, 1, M[2]]
+			self.Home[:] = [1, 0, 0, M[0], 0, 1, 0, M[1], 0, 0, 1, M[2]]
 		elif len(M) == 12:
-			self.Home = M
+			self.Home[:] = M
 		else:
 			raise ValueError("Manipulator Argument Length Error: M must contain either 3 or 12 elements.")
-		manip = self.S + self.G + self.M + self.Home
-		self._cManip = (c_double*len(manip))(*manip)
 
-	def ikin(self, p, q = []):
+	@profiled
+	def ikin(self, p, q = [], solver = SOLVER_DLS, diagnostics = False, out = None, **options):
+		# SOLVER_DLS is the backend's damped least squares solver. SOLVER_LM is the adaptive
+		# Levenberg-Marquardt solver, which accepts tol, maxSteps, damping and refresh options.
+		# The step count of the last solve is kept in ikinIterations (None if the backend
+		# doesn't report it), and with diagnostics the final position error is returned too.
+		# The joint angles are returned in a new array, or written into out (N elements).
 		if len(p) != 3:
 			raise ValueError("Manipulator Argument Length Error: p must contain 3 elements.")
 		else:
-			if len(q) != self.N:
-				q = [0] * self.N
-			cP = (c_double*len(p))(*p)
-			cQ = (c_double*len(q))(*q)
-			Manipulator._manipulatorDll.ikin(self._cManip, self._cN, cP, cQ)
-			return list(cQ)
-
-	def simStep(self, q, dq, u, timeStep):
+			self._p[:] = p
+			if len(q) == self.N:
+				self._q[:] = q
+			else:
+				self._q[:] = 0
+			if self._modelChanged:
+				self._modelChanged = False
+				self.poseCache.invalidate()
+				self._lastSolve = None
+			# A repeated request, such as a leg holding its position, returns the last result. With
+			# tolerances, requests within reuseTargetTolerance (meters) of the last target and
+			# reuseJointTolerance (radians) of the last initial guess count as repeated, and the
+			# position error of the result grows by at most reuseTargetTolerance per axis.
+			request = self._request.tobytes()
+			last = self._lastSolve
+			if last is not None and last[0] == solver and last[1] == options and (request == last[2] or
+				((self.reuseTargetTolerance or self.reuseJointTolerance) and self._withinReuseTolerance(last[2]))):
+				self._q[:] = self._lastQ
+				self.ikinIterations = 0
+				residual = last[3] if request[:24] == last[2][:24] else None
+				if diagnostics and residual is None:
+					residual = self._residual()
+			else:
+				residual = None
+				if solver == Manipulator.SOLVER_LM:
+					q = self._q.tolist()
+					self.ikinIterations, residual = ikinlm(self._S.ravel().tolist(), self._Home.tolist(), self.N, self._p.tolist(), q, cache = self.poseCache, **options)
+					self._q[:] = q
+				else:
+					self.ikinIterations = self._backend.ikin(self._cManip, self._cN, self._cP, self._cQ)
+				if diagnostics and residual is None:
+					residual = self._residual()
+				self._lastQ[:] = self._q
+				self._lastSolve = (solver, options, request, residual)
+			if diagnostics:
+				return result(self._q, out), self.ikinIterations, residual
+			return result(self._q, out)
+
+	def _withinReuseTolerance(self, lastRequest):
+		d = np.abs(self._request - np.frombuffer(lastRequest))
+		return (d[:3] <= self.reuseTargetTolerance).all() and (d[3:] <= self.reuseJointTolerance).all()
+
+	def _residual(self):
+		T = [0] * 12
+		endPose(self._S.ravel().tolist(), self._Home.tolist(), self.N, self._q.tolist(), T, cache = self.poseCache)
+		return sqrt((self._p[0] - T[3])**2 + (self._p[1] - T[7])**2 + (self._p[2] - T[11])**2)
+
+	def ikinBatch(self, P, Q0 = None):
+		P = np.ascontiguousarray(P, dtype = np.float64)
+		if P.ndim != 2 or P.shape[1] != 3:
+			raise ValueError("Manipulator Argument Length Error: P must have shape (N, 3).")
+		Q = np.zeros((len(P), self.N))
+		if Q0 is not None:
+			Q[:] = Q0
+		if self._native and hasattr(self._backend, "ikinBatch"):
+			self._backend.ikinBatch(self._cManip, self._cN, self._pointer(P), self._pointer(Q), len(P))
+		elif self._native:
+			# Libraries built before ikinBatch was added solve one target per call
+			pAddress = P.ctypes.data
+			qAddress = Q.ctypes.data
+			for i in range(len(P)):
+				cP = cast(pAddress + P.strides[0] * i, POINTER(c_double))
+				cQ = cast(qAddress + Q.strides[0] * i, POINTER(c_double))
+				self._backend.ikin(self._cManip, self._cN, cP, cQ)
+		else:
+			self._backend.ikinBatch(self._cManip, self._cN, P, Q)
+		return Q
+
+	def simStep(self, q, dq, u, timeStep, out = None):
+		# Returns the new joint positions and velocities as new arrays, or as views into out
+		# (2N elements), which receives positions then velocities
 		if len(q) != self.N:
 			raise ValueError(f"Manipulator Argument Length Error: q must contain {self.N} elements.")
 		elif len(dq) != self.N:
@@ -103,28 +297,40 @@ class Manipulator:
 		elif len(u) != self.N:
 			raise ValueError(f"Manipulator Argument Length Error: u must contain {self.N} elements.")
 		else:
-			q += dq
-			cQ = (c_double*len(q))(*q)
-			cU = (c_double*len(u))(*u)
-			cDt = c_double(timeStep)
-			Manipulator._manipulatorDll.simStep(self._cManip, self._cN, cDt, cU, cQ)
-			qdq = list(cQ)
-			return qdq[:self.N], qdq[self.N:]
-
-	def fkin(self, p0, q):
-		cP = (c_double*len(p0))(*p0)
-		cQ = (c_double*len(q))(*q)
-		Manipulator._manipulatorDll.fkin(self._cManip, self._cN, cQ, cP)
-		return list(cP)
+			self._qdq[: self.N] = q
+			self._qdq[self.N:] = dq
+			self._u[:] = u
+			self._cDt.value = timeStep
+			self._backend.simStep(self._cManip, self._cN, self._cDt, self._cU, self._cQdq)
+			qdq = result(self._qdq, out)
+			return qdq[: self.N], qdq[self.N:]
+
+	def fkin(self, p0, q, out = None):
+		# Returns the points p0 (one per joint, each in that joint's frame) in the space frame,
+		# as a new array or written into out (3N elements)
+		if len(p0) != 3 * self.N:
+			raise ValueError(f"Manipulator Argument Length Error: p0 must contain {3 * self.N} elements.")
+		elif len(q) != self.N:
+			raise ValueError(f"Manipulator Argument Length Error: q must contain {self.N} elements.")
+		self._fkinP[:] = p0
+		self._fkinQ[:] = q
+		self._backend.fkin(self._cManip, self._cN, self._cFkinQ, self._cFkinP)
+		return result(self._fkinP, out)
 	
-def dt2ht(d = 0, theta = 0, r = 0, alpha = 0):
+def result(x, out):
+	if out is None:
+		return x.copy()
+	out[:] = x
+	return out
+
+def dh2ht(d = 0, theta = 0, r = 0, alpha = 0):
 	theta = np.radians(theta)
 	sinTheta = np.sin(theta)
 	cosTheta = np.cos(theta)
 	alpha = np.radians(alpha)
 	sinAlpha = np.sin(alpha)
 	cosAlpha = np.cos(alpha)
-	return np.mat([
+	return np.array([
 		[cosTheta, -sinTheta*cosAlpha, sinTheta*sinAlpha, r*cosTheta],
 		[sinTheta, cosTheta*cosAlpha, -cosTheta*sinAlpha, r*sinTheta],
 		[0, sinAlpha, cosAlpha, d],
@@ -1,46 +1,108 @@
-
-try:
-	import hid
-except:
-	hid = None
+import numpy as np
+from threading import Lock
+from IoWorker import IoWorker
+from Profiler import profiled
 
 class OrigamiController:
-	def __init__(self, vid = 0xFFEF, pid = 0x0004):
-		self._motorBytes = [0] * 64
-		try:
+	# Each USB transfer writes a report of 32 big-endian 12-bit motor PWM values, and reads back
+	# a report whose even bytes are the low bytes of the 32 motor encoder counts. The command
+	# report is kept in a bytearray that setMotorPwm packs into, and the latest input report in
+	# another, which update decodes as a NumPy view. Once started, a worker thread runs the
+	# transfers continuously, and update only decodes the latest report, so the control loop
+	# never waits on USB.
+	def __init__(self, vid = 0xFFEF, pid = 0x0004, connect = True, usbDevice = None):
+		self._motorBytes = bytearray(65)
+		self._motorWords = np.frombuffer(memoryview(self._motorBytes)[1:], dtype = '>u2')
+		self._report = bytearray(64)
+		self._reportPositions = np.frombuffer(memoryview(self._report), dtype = np.uint8)[::2]
+		self._position = np.zeros(32, dtype = np.int64)
+		self._lock = Lock()
+		self._reportSequence = 0
+		self._decodedSequence = 0
+		self.worker = None
+		self._usbDevice = None
+		if usbDevice is not None:
+			self._open(usbDevice)
+		elif connect:
 			try:
-				self._usbDevice = hid.Device(vid, pid)
+				import hid
+				try:
+					usbDevice = hid.Device(vid, pid)
+				except:
+					usbDevice = hid.device()
+					usbDevice.open(vid, pid)
+				self._open(usbDevice)
 			except:
-				self._usbDevice = hid.device()
-				self._usbDevice.open(vid, pid)
-			self._usbDevice.write(bytes([0] + self._motorBytes))
-			self._usbDevice.read(64)
-			self._position = list(self._usbDevice.read(64))[::2]
-		except:
-			print("\nWARNING: Unable to open Origami Module USB Interface. Continuing without Origami Module motor control.")
-			self._usbDevice = None
-			self._position = [0] * 32
-	
+				print("\nWARNING: Unable to open Origami Module USB Interface. Continuing without Origami Module motor control.")
+
+	def _open(self, usbDevice):
+		usbDevice.write(bytes(self._motorBytes))
+		usbDevice.read(64)
+		report = usbDevice.read(64)
+		self._report[:len(report)] = report
+		self._position[:] = self._reportPositions
+		self._usbDevice = usbDevice
+
+	def start(self, period = 0):
+		# Moves USB transfers to a worker thread, which runs one at least every period seconds,
+		# and back to back with the default period of 0
+		if self._usbDevice is not None and self.worker is None:
+			self.worker = IoWorker("Origami USB", flush = self._transfer, period = period)
+			self.worker.start()
+
+	def stop(self):
+		if self.worker is not None:
+			self.worker.stop()
+			self.worker = None
+
+	def _transfer(self):
+		with self._lock:
+			command = bytes(self._motorBytes)
+		self._usbDevice.write(command)
+		report = self._usbDevice.read(64)
+		if report:
+			with self._lock:
+				self._report[:len(report)] = report
+				self._reportSequence += 1
+
+	@profiled
 	def update(self):
 		if self._usbDevice is None:
 			return
-		self._usbDevice.write(bytes([0] + self._motorBytes))
-		inData = list(self._usbDevice.read(64))
-		for i, pos in enumerate(self._position):
-			d = (inData[i * 2] & 0xFF) - (pos & 0xFF)
-			if d > 128:
-				d -= 256
-			elif d < -128:
-				d += 256
-			pos += max(-16, min(16, d))
-	
+		if self.worker is None:
+			self._transfer()
+		# Encoder counts wrap at 8 bits, so each report moves a position by the shortest
+		# distance to its new low byte, limited to 16 counts
+		with self._lock:
+			if self._reportSequence == self._decodedSequence:
+				return
+			self._decodedSequence = self._reportSequence
+			d = self._reportPositions - (self._position & 0xFF)
+			d[d > 128] -= 256
+			d[d < -128] += 256
+			self._position += np.clip(d, -16, 16)
+
 	def setMotorPwm(self, channel, value):
 		index = int(channel)
 		if index < 0 or index > 31:
 			raise ValueError(f"Origami Motor Channel Error: Attempted to set channel {index}. Channel must be in [0:31].")
 		value = max(-2047, min(2047, round(2048 * value)))
-		self._motorBytes[2 * index] = (value >> 8) & 0x0F
-		self._motorBytes[2 * index + 1] = value & 0xFF
+		with self._lock:
+			self._motorBytes[2 * index + 1] = (value >> 8) & 0x0F
+			self._motorBytes[2 * index + 2] = value & 0xFF
+
+	def setMotorPwms(self, channels, values):
+		# Vectorized setMotorPwm, for arrays of channels and values
+		values = np.clip(np.round(2048 * np.asarray(values, dtype = np.float64)), -2047, 2047).astype(np.int64)
+		with self._lock:
+			self._motorWords[channels] = values & 0x0FFF
 
 	def getMotorPosition(self, channel):
-		return self._position[channel]
+		return int(self._position[channel])
+
+	def getMotorPositions(self, out = None):
+		if out is None:
+			return self._position.copy()
+		with self._lock:
+			out[:] = self._position
+		return out
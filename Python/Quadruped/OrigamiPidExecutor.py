@@ -0,0 +1,119 @@
+import numpy as np
+from threading import Thread, Lock
+from LoopScheduler import LoopScheduler
+
+class OrigamiPidExecutor(Thread):
+	# Runs the position loops of every motor of the given Origami modules at a fixed rate on its
+	# own thread, as one vectorized update over all their channels. Each tick sets
+	#   effort = kv * (velocity + kp * (error + integral))
+	# where the integral accumulates ki * error per tick, is clamped to integralLimit, and is held
+	# while the effort is saturated in the direction of the error. Gains are scalars or arrays
+	# with one value per motor, in module order. Motor offsets are read when the executor is
+	# created or started, so motors should be zeroed before then.
+	def __init__(self, modules, rate = 200, kp = 2e-4, ki = 1e-2, kv = 1.95, integralLimit = 1):
+		super().__init__(name = "Origami PID", daemon = True)
+		self.modules = modules
+		self.rate = rate
+		self.motors = [motor for module in modules for motor in module.motors]
+		n = len(self.motors)
+		self.kp = np.broadcast_to(np.asarray(kp, dtype = np.float64), n).copy()
+		self.ki = np.broadcast_to(np.asarray(ki, dtype = np.float64), n).copy()
+		self.kv = np.broadcast_to(np.asarray(kv, dtype = np.float64), n).copy()
+		self.integralLimit = np.broadcast_to(np.asarray(integralLimit, dtype = np.float64), n).copy()
+		self.integral = np.zeros(n)
+		self.effort = np.zeros(n)
+
+		# Motors are grouped by controller, as the indices of the motors and their channels
+		self._groups = []
+		for i, motor in enumerate(self.motors):
+			group = next((g for g in self._groups if g[0] is motor.origamiController), None)
+			if group is None:
+				group = (motor.origamiController, [], [])
+				self._groups.append(group)
+			group[1].append(i)
+			group[2].append(motor.channel)
+		self._groups = [(controller, np.array(indices), np.array(channels)) for controller, indices, channels in self._groups]
+
+		self._lock = Lock()
+		self._position = np.zeros(n)
+		self._readOffsets()
+		self._targetPosition = self.getPositions()
+		self._targetVelocity = np.zeros(n)
+		self._running = False
+		self.scheduler = LoopScheduler(rate, stages = ('pid',))
+		self.error = None
+
+	def _readOffsets(self):
+		self._offsets = np.array([motor.offset for motor in self.motors], dtype = np.float64)
+
+	def getPositions(self):
+		for controller, indices, channels in self._groups:
+			self._position[indices] = controller.getMotorPositions()[channels]
+		return self._position - self._offsets
+
+	def setTargets(self, pos, vel = 0):
+		# Targets for every motor, in module order
+		with self._lock:
+			self._targetPosition[:] = pos
+			self._targetVelocity[:] = vel
+
+	def setTarget(self, module, pos, vel = 0):
+		# Targets for the motors of one module, like OrigamiModule.runPid
+		i = sum(len(m.motors) for m in self.modules[:self.modules.index(module)])
+		with self._lock:
+			self._targetPosition[i:i+len(module.motors)] = pos
+			self._targetVelocity[i:i+len(module.motors)] = vel
+
+	def start(self):
+		# Holds the motors where they are until given targets, and starts each controller's USB
+		# worker, so that ticks only decode the latest report
+		self._readOffsets()
+		self.integral[:] = 0
+		for controller, _, _ in self._groups:
+			controller.start()
+			controller.update()
+		self.setTargets(self.getPositions())
+		self._running = True
+		super().start()
+
+	def stop(self):
+		self._running = False
+		if self.is_alive():
+			self.join()
+		self.effort[:] = 0
+		for controller, indices, channels in self._groups:
+			controller.setMotorPwms(channels, 0)
+			controller.stop()
+			controller.update()
+
+	def run(self):
+		self.scheduler.reset()
+		while self._running:
+			self.scheduler.wait()
+			try:
+				self.step()
+			except Exception as e:
+				if self.error is None:
+					print(f"\nWARNING: Origami PID executor error: {e!r}. Continuing.")
+				self.error = e
+			self.scheduler.lap('pid')
+
+	def step(self):
+		for controller, _, _ in self._groups:
+			controller.update()
+		position = self.getPositions()
+		with self._lock:
+			e = self._targetPosition - position
+			vel = self._targetVelocity.copy()
+
+		integral = np.clip(self.integral + self.ki * e, -self.integralLimit, self.integralLimit)
+		effort = self.kv * (vel + self.kp * (e + integral))
+		windup = (np.abs(effort) >= 1) & (np.sign(effort) == np.sign(e))
+		self.integral = np.where(windup, self.integral, integral)
+		self.effort = np.clip(self.kv * (vel + self.kp * (e + self.integral)), -1, 1)
+		for controller, indices, channels in self._groups:
+			controller.setMotorPwms(channels, self.effort[indices])
+
+	def stateString(self):
+		return (f"\n  Origami PID Rate:\t\t{1 / self.scheduler.measuredPeriod:.2f} of {self.rate:.2f} Hz, {self.scheduler.overruns} overruns in {self.scheduler.ticks} ticks"
+			f"\n  Origami PID Update Time:\t{1000 * self.scheduler.stageTimes['pid']:.3f} ms")
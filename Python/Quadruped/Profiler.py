@@ -0,0 +1,123 @@
+import os
+import json
+import atexit
+from time import perf_counter_ns
+from functools import wraps
+from contextlib import nullcontext
+
+# Timing scopes for the control stack, enabled by setting QUADRUPED_PROFILE before the first
+# import. When it's unset, profiled returns functions unchanged and scope returns a shared
+# empty context, so instrumented code runs as if it weren't. When enabled, every call's
+# latency goes into a histogram of power of 2 ns buckets, the report is printed at exit, and if
+# QUADRUPED_PROFILE is a file name rather than 1, the scopes are also exported there as JSON.
+#   QUADRUPED_PROFILE=profile.json python TestQuadruped.py
+# Counts are updated without locks, so scopes entered from several threads at once can lose
+# a few samples.
+
+setting = os.environ.get("QUADRUPED_PROFILE", "")
+enabled = setting not in ("", "0")
+
+class ProfileScope:
+	# histogram[i] counts the calls that took from 2^(i-1) up to 2^i ns
+	def __init__(self, name):
+		self.name = name
+		self.reset()
+
+	def reset(self):
+		self.histogram = [0] * 64
+		self.count = 0
+		self.totalNs = 0
+		self.maxNs = 0
+
+	def add(self, ns):
+		self.histogram[ns.bit_length()] += 1
+		self.count += 1
+		self.totalNs += ns
+		if ns > self.maxNs:
+			self.maxNs = ns
+
+	def percentile(self, p):
+		# Upper edge of the bucket holding the pth percentile, in ns
+		target = p / 100 * self.count
+		total = 0
+		for i, n in enumerate(self.histogram):
+			total += n
+			if n and total >= target:
+				return min(1 << i, self.maxNs)
+		return 0
+
+	def stats(self):
+		return {
+			"count": self.count,
+			"meanUs": self.totalNs / max(1, self.count) / 1000,
+			"p50Us": self.percentile(50) / 1000,
+			"p90Us": self.percentile(90) / 1000,
+			"p99Us": self.percentile(99) / 1000,
+			"maxUs": self.maxNs / 1000,
+			"totalMs": self.totalNs / 1e6,
+			"histogram": self.histogram[:max((i + 1 for i, n in enumerate(self.histogram) if n), default = 0)]}
+
+scopes = dict()
+
+def getScope(name):
+	if name not in scopes:
+		scopes[name] = ProfileScope(name)
+	return scopes[name]
+
+def profiled(function):
+	# Decorator timing every call of function, in a scope named by its qualified name
+	if not enabled:
+		return function
+	s = getScope(function.__qualname__)
+
+	@wraps(function)
+	def wrapper(*args, **kwargs):
+		tic = perf_counter_ns()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			s.add(perf_counter_ns() - tic)
+	return wrapper
+
+class _Timer:
+	def __init__(self, scope):
+		self.scope = scope
+
+	def __enter__(self):
+		self.tic = perf_counter_ns()
+		return self
+
+	def __exit__(self, *args):
+		self.scope.add(perf_counter_ns() - self.tic)
+
+_disabledScope = nullcontext()
+
+def scope(name):
+	# Context manager timing its block in the named scope
+	return _Timer(getScope(name)) if enabled else _disabledScope
+
+def reset():
+	for s in scopes.values():
+		s.reset()
+
+def report():
+	# Scopes with samples, slowest in total first
+	sampled = sorted((s for s in scopes.values() if s.count), key = lambda s: -s.totalNs)
+	if not sampled:
+		return "\n  Profiler:\t\t\tno samples" if enabled else "\n  Profiler:\t\t\tdisabled"
+	width = max(len(s.name) for s in sampled)
+	return "\n  Profiler Scopes:" + "".join(
+		f"\n    {s.name:{width}}  {s.count:8} calls, mean {s.totalNs / s.count / 1000:9.2f} us, p50 {s.percentile(50) / 1000:9.2f} us, p99 {s.percentile(99) / 1000:9.2f} us, max {s.maxNs / 1000:9.2f} us"
+		for s in sampled)
+
+def export(fileName):
+	with open(fileName, "w") as file:
+		json.dump({name: s.stats() for name, s in scopes.items()}, file, indent = 2)
+
+def _atExit():
+	print(report())
+	if setting != "1":
+		export(setting)
+
+if enabled:
+	atexit.register(_atExit)
@@ -1,20 +1,62 @@
 
+import numpy as np
 from math import sin, cos, sqrt
 
 class PythonManipulator:
 	@staticmethod
 	def ikin(cManip, cN, cP, cQ):
-		Robot = list(cManip)
+		Robot = toList(cManip)
 		n = int(cN.value)
-		p = list(cP)
-		q = list(cQ)
+		p = toList(cP)
+		q = toList(cQ)
 		S = Robot[: 6*n]
 		M = Robot[24*n: 24*n+12]
 
-		ikina(S, M, n, p, 1e-4, 20e-3, 100, q)
+		steps = ikina(S, M, n, p, 1e-4, 20e-3, 100, q)
 
 		for i, qi in enumerate(q):
 			cQ[i] = qi
+		return steps
+
+	@staticmethod
+	def ikinBatch(cManip, cN, P, Q):
+		Robot = np.array(cManip[:], dtype = np.float64)
+		n = int(cN.value)
+		S = Robot[: 6*n].reshape(n, 6)
+		M = Robot[24*n: 24*n+12]
+
+		ikinaBatch(S, M, n, P, 1e-4, 20e-3, 100, Q)
+
+	@staticmethod
+	def fkin(cManip, cN, cQ, cP):
+		Robot = np.array(cManip[:], dtype = np.float64)
+		n = int(cN.value)
+		S = Robot[: 6*n].reshape(n, 6)
+		q = np.array(cQ[:n], dtype = np.float64)
+		p = np.array(cP[:3*n], dtype = np.float64).reshape(n, 3)
+
+		T = fkina(S, n, q)
+		p = (T[:, :, :3] @ p[:, :, None])[:, :, 0] + T[:, :, 3]
+
+		cP[:3*n] = p.ravel().tolist()
+
+	@staticmethod
+	def simStep(cManip, cN, cDt, cU, cQ):
+		Robot = np.array(cManip[:], dtype = np.float64)
+		n = int(cN.value)
+		S = Robot[: 6*n].reshape(n, 6)
+		G = Robot[6*n: 12*n].reshape(n, 6)
+		M = Robot[12*n: 24*n].reshape(n, 3, 4)
+		dt = float(cDt.value)
+		u = np.array(cU[:n], dtype = np.float64)
+		qdq = np.array(cQ[:2*n], dtype = np.float64)
+
+		simStepa(S, G, M, n, dt, u, qdq[:n], qdq[n:])
+
+		cQ[:2*n] = qdq.tolist()
+
+def toList(x):
+	return x.tolist() if isinstance(x, np.ndarray) else list(x)
 
 # WARNING: These functions are intended to mirror the C++ implementation as closely as
 # possible, and do not necessarily follow typical Python conventions or best practices.
@@ -42,7 +84,7 @@ def ikina(S, M, n, p, tol, k, maxSteps, q):
 
 		# Check Position Error Tolerance
 		if e[0] * e[0] + e[1] * e[1] + e[2] * e[2] < tol:
-			return
+			return step
 
 		# Calculate Analytical Jacobian
 		J[3] = S[3] + T[11] * S[1] - T[7] * S[2]
@@ -76,6 +118,8 @@ def ikina(S, M, n, p, tol, k, maxSteps, q):
 		for i in range(n):
 			q[i] += J[6*i+3] * e[0] + J[6*i+4] * e[1] + J[6*i+5] * e[2]
 
+	return maxSteps
+
 def jacobPose(S, q, n, J, T):
 	temp = [0.0]*12
 	tw2ht(S[:6], q[0], T)
@@ -216,3 +260,353 @@ def cholSolve(L, b, n, x):
 		for k in range(i + 1, n):
 			sum -= L[n * k + i] * x[k]
 		x[i] = sum / L[n * i + i]
+
+# Improved solver, with no counterpart in the C++ library. The damping adapts to progress
+# (Levenberg-Marquardt), each step is shortened until it reduces the error, and between full
+# recomputations the Jacobian is corrected with Broyden rank-one updates. Returns the number
+# of steps taken and the final position error.
+
+def ikinlm(S, M, n, p, q, tol = 1e-4, maxSteps = 100, damping = 1e-3, refresh = 4, minDamping = 1e-9, maxDamping = 1e3, cache = None):
+	tol *= tol
+	k = damping
+
+	J = [0] * 6 * n
+	Ja = [0] * 3 * n
+	T = [0] * 12
+	L = [0] * 9
+	d = [0] * 3
+	qn = [0] * n
+	dq = [0] * n
+
+	endPose(S, M, n, q, T, J, Ja, cache)
+	e = [p[0] - T[3], p[1] - T[7], p[2] - T[11]]
+	r = e[0] * e[0] + e[1] * e[1] + e[2] * e[2]
+	updates = 0
+
+	for step in range(maxSteps):
+		if r < tol:
+			return step, sqrt(r)
+
+		# dq = Ja' * ((Ja * Ja' + k * I) \ e)
+		for a in range(3):
+			for b in range(a, 3):
+				L[3*a+b] = sum(Ja[3*i+a] * Ja[3*i+b] for i in range(n))
+			L[4*a] += k
+		chol(L, 3)
+		cholSolve(L, e, 3, d)
+		for i in range(n):
+			dq[i] = Ja[3*i] * d[0] + Ja[3*i+1] * d[1] + Ja[3*i+2] * d[2]
+
+		# Backtracking line search
+		alpha = 1.0
+		for attempt in range(4):
+			for i in range(n):
+				qn[i] = q[i] + alpha * dq[i]
+			endPose(S, M, n, qn, T, cache = cache)
+			en = [p[0] - T[3], p[1] - T[7], p[2] - T[11]]
+			rn = en[0] * en[0] + en[1] * en[1] + en[2] * en[2]
+			if rn < r:
+				break
+			alpha *= 0.5
+
+		if rn < r:
+			q[:] = qn
+			if alpha == 1.0:
+				k = max(minDamping, 0.3 * k)
+			updates += 1
+			if updates >= refresh:
+				endPose(S, M, n, q, T, J, Ja, cache)
+				updates = 0
+			else:
+				# Ja += (dp - Ja * s) * s' / (s' * s), where dp is the observed change in position
+				ss = alpha * alpha * sum(dqi * dqi for dqi in dq)
+				if ss > 0:
+					for j in range(3):
+						y = (e[j] - en[j]) - alpha * sum(Ja[3*i+j] * dq[i] for i in range(n))
+						for i in range(n):
+							Ja[3*i+j] += y * alpha * dq[i] / ss
+			e = en
+			r = rn
+		else:
+			# No improvement along the step, so restore the exact Jacobian and damp harder
+			k = min(maxDamping, 10 * k)
+			endPose(S, M, n, q, T, J, Ja, cache)
+			updates = 0
+
+	return maxSteps, sqrt(r)
+
+def endPose(S, M, n, q, T, J = None, Ja = None, cache = None):
+	# End effector pose, and optionally the analytical (position) Jacobian
+	if cache is not None:
+		T[:] = cache.update(S, q, J is not None)
+		if J is not None:
+			J[:] = cache.J
+	elif J is None:
+		temp = [0.0] * 12
+		tw2ht(S[:6], q[0], T)
+		for i in range(1, n):
+			tw2ht(S[6*i:6*i+6], q[i], temp)
+			htMul(T, temp, T)
+	else:
+		jacobPose(S, q, n, J, T)
+		J[:6] = S[:6]
+
+	T[3] += T[0] * M[3] + T[1] * M[7] + T[2] * M[11]
+	T[7] += T[4] * M[3] + T[5] * M[7] + T[6] * M[11]
+	T[11] += T[8] * M[3] + T[9] * M[7] + T[10] * M[11]
+
+	if J is not None:
+		for i in range(n):
+			Ja[3*i] = J[6*i+3] + T[11] * J[6*i+1] - T[7] * J[6*i+2]
+			Ja[3*i+1] = J[6*i+4] + T[3] * J[6*i+2] - T[11] * J[6*i]
+			Ja[3*i+2] = J[6*i+5] + T[7] * J[6*i] - T[3] * J[6*i+1]
+
+class PoseCache:
+	# Prefix transforms T[i] = exp(S[0] * q[0]) * ... * exp(S[i] * q[i]) and Jacobian columns
+	# for the last joint vector evaluated. When a joint and every joint before it are unchanged,
+	# its prefix transform is reused rather than recomputed. Column i of the Jacobian only
+	# depends on T[i-1], so columns are reused the same way.
+	def __init__(self, n):
+		self.n = n
+		self.q = [0.0] * n
+		self.T = [[0.0] * 12 for i in range(n)]
+		self.J = [0.0] * 6 * n
+		self.hits = 0
+		self.misses = 0
+		self.invalidate()
+
+	def invalidate(self):
+		self._valid = 0
+		self._jacobianValid = 0
+
+	def update(self, S, q, jacobian = False):
+		n = self.n
+		first = 0
+		while first < self._valid and q[first] == self.q[first]:
+			first += 1
+		self.hits += first
+		self.misses += n - first
+		self._valid = n
+		self._jacobianValid = min(self._jacobianValid, first + 1)
+
+		temp = [0.0] * 12
+		for i in range(first, n):
+			self.q[i] = q[i]
+			tw2ht(S[6*i:6*i+6], q[i], temp)
+			if i == 0:
+				self.T[0][:] = temp
+			else:
+				htMul(self.T[i-1], temp, self.T[i])
+
+		if jacobian:
+			for i in range(self._jacobianValid, n):
+				if i == 0:
+					self.J[:6] = S[:6]
+				else:
+					adjoint(self.T[i-1], S[6*i:6*i+6], temp)
+					self.J[6*i:6*i+6] = temp[:6]
+			self._jacobianValid = n
+
+		return self.T[n-1]
+
+# Vectorized ports of the functions above. Each operates on a stack of m independent
+# problems at once: poses are (m, 3, 4) arrays and joint vectors are (m, n) arrays.
+
+def ikinaBatch(S, M, n, P, tol, k, maxSteps, Q):
+	tol *= tol
+
+	I = k * np.eye(3)
+	pM = M[3::4]
+	active = np.arange(len(P))
+
+	for step in range(maxSteps):
+		# Calculate Jacobian and Pose
+		q = Q[active]
+		J, T = jacobPoseBatch(S, q, n)
+		p = T[:, :, 3] + T[:, :, :3] @ pM
+
+		# Calculate Position Error
+		e = P[active] - p
+
+		# Check Position Error Tolerance
+		converged = np.einsum('mi,mi->m', e, e) < tol
+		if converged.any():
+			keep = ~converged
+			active = active[keep]
+			if len(active) == 0:
+				return
+			q, J, p, e = q[keep], J[keep], p[keep], e[keep]
+
+		# Calculate Analytical Jacobian
+		Ja = J[:, :, 3:] + np.cross(J[:, :, :3], p[:, None, :])
+
+		# L = Ja * Ja' + lambda * I
+		L = np.einsum('mni,mnj->mij', Ja, Ja) + I
+
+		# q += J' * ((J * J' + lambda * I) \ e)
+		cholBatch(L, 3)
+		cholSolveBatch(L, e, 3, e)
+
+		Q[active] = q + np.einsum('mni,mi->mn', Ja, e)
+
+def jacobPoseBatch(S, Q, n):
+	J = np.empty((len(Q), n, 6))
+	J[:, 0] = S[0]
+	T = tw2htBatch(S[0], Q[:, 0])
+	for i in range(1, n):
+		J[:, i] = adjointBatch(T, S[i])
+		T = htMulBatch(T, tw2htBatch(S[i], Q[:, i]))
+	return J, T
+
+def htMulBatch(Ta, Tb):
+	Tp = Ta[:, :, :3] @ Tb
+	Tp[:, :, 3] += Ta[:, :, 3]
+	return Tp
+
+def adjointBatch(T, V):
+	V = np.broadcast_to(V, (len(T), 6))
+	R = T[:, :, :3]
+	w = (R @ V[:, :3, None])[:, :, 0]
+	return np.concatenate((w, (R @ V[:, 3:, None])[:, :, 0] + np.cross(T[:, :, 3], w)), axis = 1)
+
+def tw2htBatch(V, theta):
+	V = np.broadcast_to(V, (len(theta), 6))
+	v = V[:, 3:, None]
+	W = np.zeros((len(theta), 3, 3))
+	W[:, 0, 1] = -V[:, 2]
+	W[:, 0, 2] = V[:, 1]
+	W[:, 1, 0] = V[:, 2]
+	W[:, 1, 2] = -V[:, 0]
+	W[:, 2, 0] = -V[:, 1]
+	W[:, 2, 1] = V[:, 0]
+	WW = W @ W
+
+	s = np.sin(theta)[:, None, None]
+	c = 1.0 - np.cos(theta)[:, None, None]
+
+	# R = eye(3) + s(theta) * w + (1 - c(theta)) * w * w
+	# p = (theta * eye(3) + (1 - c(theta)) * w + (theta - s(theta)) * w * w) * V[3:5]
+	T = np.empty((len(theta), 3, 4))
+	T[:, :, :3] = np.eye(3) + s * W + c * WW
+	T[:, :, 3:] = theta[:, None, None] * v + c * (W @ v) + (theta[:, None, None] - s) * (WW @ v)
+	return T
+
+def cholBatch(L, n):
+	for i in range(n):
+		sum = L[:, i, i].copy()
+		for k in range(i - 1, -1, -1):
+			sum -= L[:, i, k] * L[:, i, k]
+		L[:, i, i] = np.sqrt(sum)
+		for j in range(i + 1, n):
+			sum = L[:, i, j].copy()
+			for k in range(i - 1, -1, -1):
+				sum -= L[:, i, k] * L[:, j, k]
+			L[:, j, i] = sum / L[:, i, i]
+
+def cholSolveBatch(L, b, n, x):
+	for i in range(n):
+		sum = b[:, i].copy()
+		for k in range(i - 1, -1, -1):
+			sum -= L[:, i, k] * x[:, k]
+		x[:, i] = sum / L[:, i, i]
+	for i in range(n - 1, -1, -1):
+		sum = x[:, i].copy()
+		for k in range(i + 1, n):
+			sum -= L[:, k, i] * x[:, k]
+		x[:, i] = sum / L[:, i, i]
+
+# Forward kinematics and dynamics. Joint screws S are expressed in the space frame, each
+# link's centre of mass frame at the home configuration is given by M, and each link's
+# spatial inertia about that frame is the diagonal G = [Ixx, Iyy, Izz, m, m, m].
+
+gravity = 9.81
+
+def fkina(S, n, q):
+	# T[i] = exp(S[0] * q[0]) * ... * exp(S[i] * q[i])
+	T = tw2htBatch(S, q)
+	for i in range(1, n):
+		T[i] = htMulBatch(T[i-1:i], T[i:i+1])[0]
+	return T
+
+def simStepa(S, G, M, n, dt, u, q, dq):
+	# Semi-implicit Euler step of M(q) * ddq + h(q, dq) = u
+	Mq, h = massBias(S, G, M, n, q, dq)
+	ddq = np.linalg.solve(Mq, u - h)
+	dq += ddq * dt
+	q += dq * dt
+
+def massBias(S, G, M, n, q, dq):
+	# Case 0 evaluates the bias forces h(q, dq) including gravity, and case j > 0 evaluates
+	# column j-1 of the mass matrix, so all n+1 Newton-Euler passes run together.
+	dQ = np.zeros((n + 1, n))
+	dQ[0] = dq
+	ddQ = np.vstack((np.zeros(n), np.eye(n)))
+	g = np.zeros((n + 1, 6))
+	g[0, 5] = -gravity
+
+	tau = rnea(S, G, M, n, q, dQ, ddQ, g)
+	return tau[1:].T, tau[0]
+
+def rnea(S, G, M, n, q, dQ, ddQ, g):
+	# Screw axes in the link frames, and the transforms from each link frame to the next
+	Minv = htInvBatch(M)
+	A = adjointBatch(Minv, S)
+	Mrel = htMulBatch(Minv, np.concatenate((htIdentity(1), M[:-1])))
+	Ad = adjointMatrixBatch(htMulBatch(tw2htBatch(A, -q), Mrel))
+
+	K = len(dQ)
+	V = np.zeros((n, K, 6))
+	dV = np.zeros((n, K, 6))
+
+	# Forward pass: link twists and accelerations
+	Vi = np.zeros((K, 6))
+	dVi = -g
+	for i in range(n):
+		Vi = Vi @ Ad[i].T + A[i] * dQ[:, i:i+1]
+		dVi = dVi @ Ad[i].T + adBatch(Vi, A[i]) * dQ[:, i:i+1] + A[i] * ddQ[:, i:i+1]
+		V[i] = Vi
+		dV[i] = dVi
+
+	# Backward pass: link wrenches and joint torques
+	tau = np.empty((K, n))
+	F = np.zeros((K, 6))
+	for i in range(n - 1, -1, -1):
+		if i < n - 1:
+			F = F @ Ad[i+1]
+		F += G[i] * dV[i] - adTransposeBatch(V[i], G[i] * V[i])
+		tau[:, i] = F @ A[i]
+	return tau
+
+def adBatch(V, X):
+	X = np.broadcast_to(X, V.shape)
+	return np.concatenate((np.cross(V[:, :3], X[:, :3]), np.cross(V[:, 3:], X[:, :3]) + np.cross(V[:, :3], X[:, 3:])), axis = 1)
+
+def adTransposeBatch(V, F):
+	return np.concatenate((-np.cross(V[:, :3], F[:, :3]) - np.cross(V[:, 3:], F[:, 3:]), -np.cross(V[:, :3], F[:, 3:])), axis = 1)
+
+def adjointMatrixBatch(T):
+	R = T[:, :, :3]
+	p = T[:, :, 3]
+	P = np.zeros((len(T), 3, 3))
+	P[:, 0, 1] = -p[:, 2]
+	P[:, 0, 2] = p[:, 1]
+	P[:, 1, 0] = p[:, 2]
+	P[:, 1, 2] = -p[:, 0]
+	P[:, 2, 0] = -p[:, 1]
+	P[:, 2, 1] = p[:, 0]
+	Ad = np.zeros((len(T), 6, 6))
+	Ad[:, :3, :3] = R
+	Ad[:, 3:, :3] = P @ R
+	Ad[:, 3:, 3:] = R
+	return Ad
+
+def htInvBatch(T):
+	Ti = np.empty_like(T)
+	Ti[:, :, :3] = T[:, :, :3].transpose(0, 2, 1)
+	Ti[:, :, 3] = -(Ti[:, :, :3] @ T[:, :, 3:])[:, :, 0]
+	return Ti
+
+def htIdentity(m):
+	T = np.zeros((m, 3, 4))
+	T[:, :, :3] = np.eye(3)
+	return T
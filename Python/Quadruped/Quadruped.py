@@ -1,22 +1,38 @@
 
-from time import time, localtime, strftime
-from math import sin, cos, pi
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from time import time, perf_counter, localtime, strftime
+from math import sin, cos, pi, degrees
 from QuadrupedGait import QuadrupedGait, GaitTrajectory
 from QuadrupedLeg import QuadrupedLeg
+from QuadrupedBackends import openBackends
+from Manipulator import Manipulator
 from QuadrupedServo import QuadrupedServo
-from ServoController import ServoController
-from WebotsServoController import WebotsServoController
-from OrigamiController import OrigamiController
+from LoopScheduler import LoopScheduler
+from FlightRecorder import FlightRecorder
+import Profiler
+from Profiler import profiled
+from IoWorker import IoWorker, DoubleBuffer
 from OrigamiModule import OrigamiModule
 from OrigamiMotor import OrigamiMotor
 
 class Quadruped:
-	def __init__(self):
-		self.ServoController = ServoController(address = 0x40)
-		self.WebotsController = WebotsServoController()
-		self.OrigamiController = OrigamiController()
+	def __init__(self, threadedIo = False, headless = False, backends = None, flightRecorderTicks = 10000):
+		# Backends names the drivers to open from QuadrupedBackends, all of them by default. A
+		# headless robot opens none: servos only track their angles, the Origami Module isn't
+		# opened, and Webots is replaced by a clock that can run on simulated time.
+		self.headless = headless
+		devices, self.startupTimes = openBackends(() if headless else backends)
+		self.ServoController = devices['servo']
+		self.WebotsController = devices['webots']
+		self.OrigamiController = devices['origami']
+		start = perf_counter()
+		Manipulator.loadLibrary()
+		self.startupTimes['kinematics'] = perf_counter() - start
 		self.updatePeriod = 0
 		self.updateRate = 0
+		self.scheduler = None
+		self.recording = None
 		
 		self.Gaits = [
 			QuadrupedGait(descriptionText = "Fast Walk"),
@@ -25,6 +41,8 @@ class Quadruped:
 			QuadrupedGait(descriptionText = "Slow Walk with Sway", maxBodyHeight = 6.5, stepFrequency = 0.6, xSway = 1, ySway = 2),
 			QuadrupedGait(descriptionText = "Fast Walk with Wide Stance", maxBodyHeight = 6, xStance = 1, yStance = 1)]
 		self.activeGait = int(0)
+		for gait in self.Gaits:
+			gait.compile()
 
 		self.Spine = OrigamiModule(
 			OrigamiMotor(self.OrigamiController, channel = 5),
@@ -56,32 +74,103 @@ class Quadruped:
 			knee = QuadrupedServo(offset = 20, physicalServo = self.ServoController.addServo(13), webotsServo = self.WebotsController.addServo("BackRightKnee")))
 
 		self.Legs = [FrontLeftLeg, BackLeftLeg, FrontRightLeg, BackRightLeg]
+		self._legHome = np.array([leg.Home for leg in self.Legs])
+		self._xStanceSign = np.array([1 if leg.isRightLeg else -1 for leg in self.Legs])
+		self._yStanceSign = np.array([1 if leg.isFrontLeg else -1 for leg in self.Legs])
+
+		# With threaded I/O, the control loop publishes servo commands to a double buffer and
+		# worker threads own the I2C and USB transactions.
+		self.threadedIo = threadedIo
+		self._servos = [joint for leg in self.Legs for joint in leg.joints]
+		self._servoBuffer = DoubleBuffer(len(self._servos))
+		self._ioWorkers = []
+
+		# The flight recorder keeps the last flightRecorderTicks ticks of run (none if 0), and is
+		# dumped by dumpFlightRecord or when run raises
+		self.flightRecorder = FlightRecorder(flightRecorderTicks) if flightRecorderTicks else None
+		self.gaitPhase = 0.0
+		self.footTargets = np.zeros((3, 4))
+		self.ikinIterations = np.full(4, -1, dtype = np.int16)
 
 	def printState(self):
 		t = time()
 		print(f"\nQuadruped State at {strftime(f'%I:%M:%S.{round(1000*(t%1))} %p', localtime(t))}:"
 			f"\n  Gait: {self.Gaits[self.activeGait].descriptionText}"
 			f"\n  Control Loop Update Rate:\t{self.updateRate:.2f} Hz"
-			f"\n  Spine Motor Positions:\t{self.Spine.getMotorPositions()}")
+			f"\n  Spine Motor Positions:\t{self.Spine.getMotorPositions()}"
+			+ (self.scheduler.stateString() if self.scheduler is not None else "")
+			+ f"\n  Servo Commands:\t\t{sum(s.physicalWrites for s in self._servos)} physical, {sum(s.webotsWrites for s in self._servos)} Webots, {sum(s.suppressedWrites for s in self._servos)} suppressed"
+			+ f"\n  Servo I2C Transfers:\t\t{self.ServoController.transferCount} ({self.ServoController.channelWriteCount} channel writes)"
+			+ f"\n  Backend Startup Times:\t{', '.join(f'{name} {1000 * t:.1f} ms' for name, t in self.startupTimes.items())}"
+			+ "".join(worker.stateString() for worker in self._ioWorkers)
+			+ (Profiler.report() if Profiler.enabled else ""))
 		print("\n".join(f"  {leg.legTypeString} Leg Joint Angles:\t[{', '.join(f'{a:6.2f}°' for a in leg.getJointAngles())}]" for leg in self.Legs))
 	
+	def loadIkinTables(self, directory = "."):
+		for leg in self.Legs:
+			leg.loadIkinTable(f"{directory}/IkinTable{leg.legTypeString.replace(' ', '')}.npy")
+
 	def nextGait(self):
 		self.activeGait = self.activeGait + 1 if self.activeGait + 1 < len(self.Gaits) else 0
 
-	def run(self, xbox):
+	def runHeadless(self, xbox, duration, timeStep = 0.01):
+		# Runs the control loop for duration seconds of simulated time in steps of timeStep
+		# seconds (rounded to whole ms), as fast as possible, usually on a headless robot with a
+		# ScriptedController. Returns the time of each tick and the joint angles commanded on
+		# it, in degrees and in the order of the legs' joints, as (ticks,) and (ticks, 12) arrays.
+		simStep = max(1, round(1000 * timeStep))
+		ticks = int(1000 * duration) // simStep + 1
+		self.recording = (np.empty(ticks), np.empty((ticks, len(self._servos))))
+		self.WebotsController.simStep = simStep
+		try:
+			ticks = self.run(xbox, duration = duration)
+			return self.recording[0][:ticks], self.recording[1][:ticks]
+		finally:
+			self.recording = None
+
+	def dumpFlightRecord(self, fileName = None):
+		if self.flightRecorder is None:
+			return None
+		fileName = fileName or f"FlightRecord-{strftime('%Y%m%d-%H%M%S')}.npy"
+		self.flightRecorder.dump(fileName)
+		print(f"\nFlight record of {min(self.flightRecorder.count, self.flightRecorder.capacity)} ticks saved to {fileName}.")
+		return fileName
+
+	def run(self, xbox, rate = None, duration = None):
+		# With a rate (Hz), the loop runs on absolute deadlines and the gait is driven by the
+		# nominal tick time. Otherwise it runs as fast as possible on Webots simulation time.
+		# With a duration (s), the loop ends after the first tick at or past it. While a
+		# recording is set, the commanded joint angles of each tick are stored in it. Returns
+		# the number of ticks run.
+		try:
+			return self._run(xbox, rate, duration)
+		except BaseException:
+			self.dumpFlightRecord()
+			raise
+
+	def _run(self, xbox, rate, duration):
 		print("\nPress START to continue.")
 
+		self.scheduler = LoopScheduler(rate) if rate else None
+		if self.threadedIo:
+			self._startIo()
 		self.WebotsController.reset()
 		now = 0
 		state = 0
+		ticks = 0
 		while True:
-			timeStep = now
-			now = self.WebotsController.simTime / 1000
-			timeStep = now - timeStep
+			if self.scheduler is None:
+				timeStep = now
+				now = self.WebotsController.simTime / 1000
+				timeStep = now - timeStep
+			else:
+				now, timeStep = self.scheduler.wait()
 			self.updatePeriod = max(timeStep, 0.99 * self.updatePeriod + 0.01 * timeStep)
 			self.updateRate = 0.99 * self.updateRate + 0.01 / max(1e-6, self.updatePeriod)
 			
 			xbox.update(now)
+			self._lap('controller')
+			self.ikinIterations[:] = -1
 
 			if state == 1:
 				if xbox.Start:
@@ -101,56 +190,153 @@ class Quadruped:
 				if not xbox.Start:
 					state = 1
 
+			if self.recording is not None and ticks < len(self.recording[0]):
+				self.recording[0][ticks] = now
+				self.recording[1][ticks] = [servo.angle for servo in self._servos]
+			ticks += 1
+
+			if not self.threadedIo:
+				self.ServoController.update()
+				self._lap('servo')
+
 			self.Spine.runMotors((
 				0.5 * xbox.DpadY + 0.5 * xbox.DpadX,
 				0.5 * xbox.DpadY,
 				0.5 * xbox.DpadY - 0.5 * xbox.DpadX))
 
+			if self.threadedIo:
+				self._servoBuffer.publish([servo.physicalAngle for servo in self._servos])
+				for worker in self._ioWorkers:
+					worker.notify()
 			self.OrigamiController.update()
-			if self.WebotsController.update():
+			self._lap('usb')
+			webotsTerminated = self.WebotsController.update()
+			self._lap('webots')
+			if self.flightRecorder is not None:
+				self.flightRecorder.record(self, xbox, now, timeStep, state)
+			if webotsTerminated:
 				print("\nQuadruped Test Complete (Terminated by Webots).\n")
 				break
 			if xbox.Select:
 				print("\nQuadruped Test Complete (Terminated by Xbox Controller).\n")
 				break
+			if duration is not None and now >= duration:
+				print("\nQuadruped Test Complete (Duration Reached).\n")
+				break
 		
+		self._stopIo()
 		self.Spine.stop()
 		self.OrigamiController.update()
 		self.home()
+		self.ServoController.update()
+		return ticks
+
+	def _startIo(self):
+		for servo in self._servos:
+			servo.deferPhysical = True
+		self._ioWorkers = [IoWorker("I2C", flush = self._flushServos, buffer = self._servoBuffer)]
+		for worker in self._ioWorkers:
+			worker.start()
+		# The Origami Module runs its own USB worker, and update only decodes its latest report
+		self.OrigamiController.start()
+		if self.OrigamiController.worker is not None:
+			self._ioWorkers.append(self.OrigamiController.worker)
+
+	def _stopIo(self):
+		for worker in self._ioWorkers:
+			worker.stop()
+		self.OrigamiController.stop()
+		for servo in self._servos:
+			servo.deferPhysical = False
+		if self._ioWorkers:
+			self._flushServos([servo.physicalAngle for servo in self._servos])
+
+	def _flushServos(self, angles):
+		for servo, angle in zip(self._servos, angles):
+			if servo.physicalServo is not None:
+				servo.physicalServo.angle = float(angle)
+		self.ServoController.update()
+
+	def _lap(self, stage):
+		if self.scheduler is not None:
+			self.scheduler.lap(stage)
 
 	def home(self):
 		for leg in self.Legs:
 			leg.setJointAngles([0, 0, 0])
+		self._lap('servo')
 
 	def stand(self, bodyHeight = 7):
 		for leg in self.Legs:
 			leg.setPose2D(0, -bodyHeight)
+		self._lap('servo')
 
+	@profiled
 	def runGait(self, xbox, time, gait):
+		x, y, z = self.gaitTargets(xbox, time, gait)
+		self.gaitPhase = time * gait.stepFrequency
+		self.footTargets[0] = x
+		self.footTargets[1] = y
+		self.footTargets[2] = z
+		self._lap('gait')
+
+		if xbox.A:
+			jointAngles = [[0, *(degrees(a) for a in leg.pose2D(y[i] - leg.Home[1], z[i]))] for i, leg in enumerate(self.Legs)]
+		else:
+			jointAngles = [[degrees(a) for a in leg.solvePose(x[i], y[i], z[i])] for i, leg in enumerate(self.Legs)]
+			for i, leg in enumerate(self.Legs):
+				self.ikinIterations[i] = -1 if leg.manip.ikinIterations is None else leg.manip.ikinIterations
+		self._lap('ik')
+
+		for leg, angles in zip(self.Legs, jointAngles):
+			leg.setJointAngles(angles)
+		self._lap('servo')
+
+	def gaitTargets(self, xbox, time, gait):
+		# Foot positions (x, y, z) of all four legs at the given time, for controller inputs
+		# from xbox or any object with the same attributes, such as GaitInputs
 		phase = time * gait.stepFrequency
 		stepHeight = gait.minStepHeight + (gait.maxStepHeight - gait.minStepHeight) * xbox.RightTrigger
 		bodyHeight = gait.maxBodyHeight + (gait.minBodyHeight + stepHeight - gait.maxBodyHeight) * xbox.LeftTrigger
 
-		for i, leg in enumerate(self.Legs):
-			u, v = gait.trajectory(phase, i)
-			
-			x = gait.xStride * xbox.LeftX * u
-			y = gait.yStride * xbox.LeftY * u
+		u, v = gait.evaluate(phase)
 
-			Rc = cos(pi * gait.spin * u * xbox.RightX)
-			Rs = sin(pi * gait.spin * u * xbox.RightX)
-			x += Rc * leg.Home[0] + Rs * leg.Home[1]
-			y += Rc * leg.Home[1] - Rs * leg.Home[0]
-			
-			x -= gait.xSway * cos(2 * pi * phase)
-			y += gait.ySway * sin(4 * pi * phase)
-			x += gait.xStance if leg.isRightLeg else -gait.xStance
-			y += gait.yStance if leg.isFrontLeg else -gait.yStance
+		x = gait.xStride * xbox.LeftX * u
+		y = gait.yStride * xbox.LeftY * u
+
+		Rc = np.cos(pi * gait.spin * xbox.RightX * u)
+		Rs = np.sin(pi * gait.spin * xbox.RightX * u)
+		x += Rc * self._legHome[:, 0] + Rs * self._legHome[:, 1]
+		y += Rc * self._legHome[:, 1] - Rs * self._legHome[:, 0]
+
+		x += self._xStanceSign * gait.xStance - gait.xSway * cos(2 * pi * phase)
+		y += self._yStanceSign * gait.yStance + gait.ySway * sin(4 * pi * phase)
+
+		z = stepHeight * v - bodyHeight
+		z += y * gait.pitch * xbox.RightY
+
+		return x, y, z
 
-			z = stepHeight * v - bodyHeight
-			z += y * gait.pitch * xbox.RightY
+	def solveGaitCycle(self, gait, inputs, samples = 64, period = None):
+		# Joint angles in degrees of all four legs at samples evenly spaced phases over one gait
+		# period (the gait's own by default), as a (4, samples, 3) array, without moving any
+		# servos. Samples are solved in order, each warm-started from the last, and the legs are
+		# solved in parallel.
+		period = gait.checkPeriod(period)
+		phases = np.arange(samples) * period / samples
+		targets = np.array([self.gaitTargets(inputs, phase / gait.stepFrequency, gait) for phase in phases])
+		with ThreadPoolExecutor(len(self.Legs)) as executor:
+			return np.array(list(executor.map(lambda i: self._solveLegCycle(self.Legs[i], targets[:, :, i], inputs.A), range(len(self.Legs)))))
 
-			if xbox.A:
-				leg.setPose2D(y - leg.Home[1], z)
+	def _solveLegCycle(self, leg, targets, pose2D):
+		angles = np.empty((len(targets), 3))
+		q = None
+		for k, (x, y, z) in enumerate(targets):
+			if pose2D:
+				angles[k] = [0, *leg.pose2D(y - leg.Home[1], z)]
 			else:
-				leg.setPose(x, y, z)
+				if q is None:
+					q = [0, *leg.pose2D(y, z)]
+				q = leg.solvePose(x, y, z, q)
+				angles[k] = q
+		return np.degrees(angles)
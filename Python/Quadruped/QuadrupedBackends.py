@@ -0,0 +1,68 @@
+from time import perf_counter
+
+# Registry of the hardware and simulator drivers a Quadruped can use, by name. Each entry has a
+# function that opens the driver and one that opens its stand-in, which is used when the driver
+# isn't selected. Driver modules are only imported when their driver is opened, so a robot that
+# doesn't select one never imports its libraries or probes for its device.
+
+class NullServoController:
+	# Stands in for ServoController when no servo driver is selected. Servos have no physical
+	# channel, so QuadrupedServo only tracks their angles.
+	def __init__(self):
+		self.servoList = dict()
+		self.frequency = 0
+		self.transferCount = 0
+		self.channelWriteCount = 0
+
+	def addServo(self, channel, **kwargs):
+		return None
+
+	def update(self):
+		return
+
+def openServoController(bulk = False):
+	# Bulk register writes are opt-in until they're validated on the robot. To use them,
+	# register lambda: openServoController(bulk = True) as the servo backend.
+	from ServoController import ServoController
+	return ServoController(address = 0x40, bulk = bulk)
+
+def openWebotsController():
+	from WebotsServoController import WebotsServoController
+	return WebotsServoController()
+
+def openSimulatedClock():
+	# Without Webots, the controller still keeps time: wall-clock time by default, or
+	# simulated time once given a time step
+	from WebotsServoController import WebotsServoController, NullWebot
+	return WebotsServoController(webot = NullWebot())
+
+def openOrigamiController():
+	from OrigamiController import OrigamiController
+	return OrigamiController()
+
+def openNullOrigamiController():
+	from OrigamiController import OrigamiController
+	return OrigamiController(connect = False)
+
+Backends = {
+	'servo': (openServoController, NullServoController),
+	'webots': (openWebotsController, openSimulatedClock),
+	'origami': (openOrigamiController, openNullOrigamiController)}
+
+def registerBackend(name, open, standIn):
+	Backends[name] = (open, standIn)
+
+def openBackends(selected = None):
+	# Opens the selected drivers, or all of them by default, and the stand-ins of the rest.
+	# Returns the opened objects and the seconds each took to open, both by name.
+	selected = tuple(Backends) if selected is None else selected
+	for name in selected:
+		if name not in Backends:
+			raise ValueError(f"Quadruped Backend Error: {name} is not a registered backend. Backends are {', '.join(Backends)}.")
+	devices = dict()
+	startupTimes = dict()
+	for name, (open, standIn) in Backends.items():
+		start = perf_counter()
+		devices[name] = open() if name in selected else standIn()
+		startupTimes[name] = perf_counter() - start
+	return devices, startupTimes
@@ -1,8 +1,18 @@
 
+import numpy as np
 from math import cos, pi
 
+def gaitPeriod(period):
+	# Marks a trajectory function with its period, the phase (in steps) after which every
+	# leg's trajectory repeats
+	def mark(trajectory):
+		trajectory.period = period
+		return trajectory
+	return mark
+
 class GaitTrajectory:
 	@staticmethod
+	@gaitPeriod(4)
 	def walk(t, i):
 		t = (t + i) % 4
 		if t < 1:
@@ -14,6 +24,7 @@ class GaitTrajectory:
 		return x, y
 
 	@staticmethod
+	@gaitPeriod(2)
 	def trot(t, i):
 		t = (t + (0, 1, 1, 0)[i]) % 2
 		if t < 1:
@@ -24,6 +35,18 @@ class GaitTrajectory:
 			y = 0
 		return x, y
 
+class GaitInputs:
+	# Fixed controller inputs, with the attributes of XboxController that gaits read, for
+	# evaluating gaits without a controller
+	def __init__(self, LeftX = 0, LeftY = 0, RightX = 0, RightY = 0, LeftTrigger = 0, RightTrigger = 0, A = 0):
+		self.LeftX = LeftX
+		self.LeftY = LeftY
+		self.RightX = RightX
+		self.RightY = RightY
+		self.LeftTrigger = LeftTrigger
+		self.RightTrigger = RightTrigger
+		self.A = A
+
 class QuadrupedGait:
 	def __init__(self,
 		trajectory = GaitTrajectory.walk,
@@ -34,9 +57,13 @@ class QuadrupedGait:
 		xStride = 3, yStride = 3,
 		spin = 0.1, pitch = 0.2,
 		xSway = 0, ySway = 0,
-		xStance = 0, yStance = 0):
+		xStance = 0, yStance = 0,
+		period = None):
 
+		# The period defaults to the one the trajectory is marked with by gaitPeriod, or to the
+		# 4 steps every gait was sampled over before periods were marked
 		self.trajectory = trajectory
+		self.period = period if period is not None else getattr(trajectory, 'period', 4)
 		self.descriptionText = descriptionText
 		self.stepFrequency = stepFrequency
 		self.minStepHeight = minStepHeight
@@ -51,3 +78,46 @@ class QuadrupedGait:
 		self.ySway = ySway
 		self.xStance = xStance
 		self.yStance = yStance
+		self._table = None
+
+	def checkPeriod(self, period = None):
+		# Returns the gait's period by default, and otherwise checks that period is a whole
+		# number of them
+		if period is None:
+			return self.period
+		cycles = period / self.period
+		if round(cycles) < 1 or abs(cycles - round(cycles)) > 1e-9:
+			raise ValueError(f"Gait Period Error: period must be a multiple of the gait's period of {self.period}, not {period}.")
+		return period
+
+	def compile(self, resolution = 256, interpolation = "linear", period = None):
+		# Samples the trajectory of all four legs over one period, the gait's own by default,
+		# so that evaluate costs a table lookup however expensive the trajectory function is
+		period = self.checkPeriod(period)
+		if interpolation not in ("linear", "cubic"):
+			raise ValueError(f"Gait Interpolation Error: interpolation must be 'linear' or 'cubic', not '{interpolation}'.")
+		phase = np.arange(resolution) * period / resolution
+		self._table = np.array([[self.trajectory(t, i) for t in phase] for i in range(4)])
+		self._period = period
+		self._interpolation = interpolation
+
+	def evaluate(self, phase):
+		# Returns the (u, v) trajectory coordinates of all four legs as two arrays
+		if self._table is None:
+			u, v = zip(*(self.trajectory(phase, i) for i in range(4)))
+			return np.array(u), np.array(v)
+
+		n = self._table.shape[1]
+		s = (phase % self._period) * n / self._period
+		i = int(s) % n
+		f = s - int(s)
+		p1 = self._table[:, i]
+		p2 = self._table[:, (i + 1) % n]
+		if self._interpolation == "linear":
+			p = p1 + f * (p2 - p1)
+		else:
+			# Catmull-Rom spline through the neighbouring samples
+			p0 = self._table[:, i - 1]
+			p3 = self._table[:, (i + 2) % n]
+			p = p1 + 0.5 * f * (p2 - p0 + f * (2*p0 - 5*p1 + 4*p2 - p3 + f * (3*(p1 - p2) + p3 - p0)))
+		return p[:, 0], p[:, 1]
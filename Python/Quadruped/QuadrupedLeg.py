@@ -1,6 +1,9 @@
 
-from math import radians, degrees, sqrt, acos, atan2, pi
+from math import radians, degrees, sqrt, sin, cos, acos, atan2, pi
+from os.path import exists
 from Manipulator import Manipulator
+from IkinTable import IkinTable
+from Units import inch2meter, meter2inch, wrapAngle
 
 class QuadrupedLeg:
 	FRONT_LEFT = 0
@@ -8,25 +11,73 @@ class QuadrupedLeg:
 	BACK_RIGHT = 2
 	BACK_LEFT = 3
 
-	def __init__(self, legType, hip1, hip2, knee):
+	IKIN_ITERATIVE = 0
+	IKIN_ANALYTIC = 1
+	IKIN_TABLE = 2
+
+	def __init__(self, legType, hip1, hip2, knee, ikinMode = IKIN_ITERATIVE):
 		self.legType = legType
 		self.isFrontLeg = (True, True, False, False)[legType]
 		self.isRightLeg = (False, True, True, False)[legType]
 		self.legTypeString = ("Front Left", "Front Right", "Back Right", "Back Left")[legType]
 		self.joints = (hip1, hip2, knee)
+		self.ikinMode = ikinMode
+		self.ikinTable = None
+		self.ikinOptions = dict()
+		self.ikinTableSteps = 1
+		self.ikinTableTolerance = 1e-4
+		self.ikinTableDamping = 1e-6
 		sx = 1 if self.isRightLeg else -1
 		sy = 1 if self.isFrontLeg else -1
-		self.manip = Manipulator()
-		self.manip.addRevolute(w = [0, sy, 0], p = [0.0446 * sx, 0.0951 * sy, 0])
-		self.manip.addRevolute(w = [sx, 0, 0], p = [0.0869 * sx, 0.1243 * sy, 0])
-		self.manip.addRevolute(w = [sx, 0, 0], p = [0.1027 * sx, 0.1243 * sy, -0.0889])
+		hip1Position = (0.0446 * sx, 0.0951 * sy, 0)
+		hip2Position = (0.0869 * sx, 0.1243 * sy, 0)
+		kneePosition = (0.1027 * sx, 0.1243 * sy, -0.0889)
 		home = (0.1027 * sx, 0.1243 * sy, -0.1842)
+		self.manip = Manipulator()
+		self.manip.addRevolute(w = [0, sy, 0], p = list(hip1Position))
+		self.manip.addRevolute(w = [sx, 0, 0], p = list(hip2Position))
+		self.manip.addRevolute(w = [sx, 0, 0], p = list(kneePosition))
 		self.manip.setHome(home)
 		self.Home = [meter2inch(x) for x in home]
 
+		# Closed form geometry: Hip 1 turns the leg plane about y, and Hip 2 and the knee
+		# form a planar two-link chain in that plane, offset laterally from the Hip 1 axis.
+		self._sx = sx
+		self._sy = sy
+		self._hip1Position = hip1Position
+		self._lateralOffset = home[0] - hip1Position[0]
+		self._hip2Height = hip2Position[2] - hip1Position[2]
+		self._hip2Forward = hip2Position[1]
+		self._upperLength = hip2Position[2] - kneePosition[2]
+		self._lowerLength = kneePosition[2] - home[2]
+
 	def setPose(self, x, y, z):
+		q = self.solvePose(x, y, z)
+		self.setJointAngles([degrees(qi) for qi in q])
+
+	def solvePose(self, x, y, z, q = None):
 		p = [inch2meter(a) for a in (x, y, z)]
-		q = [radians(joint.angle) for joint in self.joints]
+
+		if self.ikinMode == QuadrupedLeg.IKIN_ANALYTIC:
+			qa = self.ikinAnalytic(p)
+			if qa is not None:
+				self.manip.ikinIterations = 0
+				return qa
+		elif self.ikinMode == QuadrupedLeg.IKIN_TABLE and self.ikinTable is not None:
+			# The interpolated solution is already close, so it's refined with ikinTableSteps lightly
+			# damped Levenberg-Marquardt steps, and only solved to convergence if it's still further
+			# than ikinTableTolerance (meters) from the target
+			qt = self.ikinTable.lookup(p)
+			if qt is not None:
+				q, steps, residual = self.manip.ikin(p, qt, Manipulator.SOLVER_LM, diagnostics = True, tol = self.ikinTableTolerance, maxSteps = self.ikinTableSteps, damping = self.ikinTableDamping)
+				if residual < self.ikinTableTolerance:
+					return q
+				return self.manip.ikin(p, q, Manipulator.SOLVER_LM, tol = self.ikinTableTolerance)
+
+		if q is None:
+			q = [radians(joint.angle) for joint in self.joints]
+		else:
+			q = list(q)
 
 		if self.legType == QuadrupedLeg.FRONT_RIGHT or self.legType == QuadrupedLeg.BACK_LEFT:
 			if q[2] > 0:
@@ -34,8 +85,41 @@ class QuadrupedLeg:
 		elif q[2] < 0:
 			q[1:] = self.pose2D(y, z)
 
-		q = self.manip.ikin(p, q)
-		self.setJointAngles([degrees(qi) for qi in q])
+		return self.manip.ikin(p, q, **self.ikinOptions)
+
+	def loadIkinTable(self, fileName, **buildArgs):
+		if exists(fileName):
+			self.ikinTable = IkinTable.load(fileName)
+		else:
+			self.ikinTable = IkinTable.build(self, **buildArgs)
+			self.ikinTable.save(fileName)
+		self.ikinMode = QuadrupedLeg.IKIN_TABLE
+
+	def ikinAnalytic(self, p, singularityTolerance = 1e-3):
+		# Returns None near singularities, where the caller should use the iterative solver.
+		a = self._lateralOffset
+		dx = p[0] - self._hip1Position[0]
+		dz = p[2] - self._hip1Position[2]
+		r2 = dx*dx + dz*dz - a*a
+		if r2 < singularityTolerance * singularityTolerance:
+			return None
+
+		# Hip 1 rotates the foot from (a, zLeg) in the leg plane to (dx, dz)
+		zLeg = -sqrt(r2)
+		hip1Angle = atan2(dx, dz) - atan2(a, zLeg)
+
+		# Planar two-link solution, with the knee bent the same way as pose2D
+		L1 = self._upperLength
+		L2 = self._lowerLength
+		y = p[1] - self._hip2Forward
+		z = zLeg - self._hip2Height
+		c = (y*y + z*z - L1*L1 - L2*L2) / (2*L1*L2)
+		if abs(c) > 1 - singularityTolerance:
+			return None
+		kneeAngle = -self._sy * acos(c)
+		hip2Angle = atan2(z, y) - atan2(-L1 - L2 * cos(kneeAngle), L2 * sin(kneeAngle))
+
+		return [self._sy * wrapAngle(hip1Angle), self._sx * wrapAngle(hip2Angle), self._sx * kneeAngle]
 
 	def pose2D(self, y, z, L1 = 3.5, L2 = 3.75):
 		if not self.isFrontLeg:
@@ -62,9 +146,3 @@ class QuadrupedLeg:
 			jointString = ("Hip 1", "Hip 2", "Knee")[i]
 			print(f"\nJoint Angle Error in {self.legTypeString} leg. {jointString} joint set to {jointAngles[i]:.2f}°.\n")
 			raise
-
-def inch2meter(x):
-	return 0.0254 * x
-
-def meter2inch(x):
-	return x / 0.0254
@@ -1,16 +1,46 @@
-
 from math import radians
+from Profiler import profiled
 
 class QuadrupedServo:
+	# Physical commands are compared by the PCA9685 counts the servo driver would write, and
+	# commands that don't change them are suppressed, as are repeated Webots positions. The
+	# physical angle is the last one sent.
 	def __init__(self, offset = 0, physicalServo = None, webotsServo = None):
 		self.offset = offset
 		self.physicalServo = physicalServo
 		self.webotsServo = webotsServo
+		self._counts = getattr(physicalServo, 'counts', None)
 		self.angle = 0
+		self.physicalAngle = max(0, min(180, offset))
+		self.deferPhysical = False
+		self.physicalWrites = 0
+		self.webotsWrites = 0
+		self.suppressedWrites = 0
+		self._lastCounts = None
+		self._lastWebotsAngle = None
 
+	@profiled
 	def setAngle(self, angle):
 		self.angle = angle
-		if self.physicalServo is not None:
-			self.physicalServo.angle = max(0, min(180, angle + self.offset))
+		physicalAngle = max(0, min(180, angle + self.offset))
+
+		if self.physicalServo is None:
+			self.physicalAngle = physicalAngle
+		else:
+			counts = self._counts(physicalAngle) if self._counts is not None else physicalAngle
+			if counts != self._lastCounts:
+				self._lastCounts = counts
+				self.physicalAngle = physicalAngle
+				self.physicalWrites += 1
+				if not self.deferPhysical:
+					self.physicalServo.angle = self.physicalAngle
+			else:
+				self.suppressedWrites += 1
+
 		if self.webotsServo is not None:
-			self.webotsServo.setPosition(radians(angle))
+			if angle != self._lastWebotsAngle:
+				self._lastWebotsAngle = angle
+				self.webotsWrites += 1
+				self.webotsServo.setPosition(radians(angle))
+			else:
+				self.suppressedWrites += 1
@@ -0,0 +1,83 @@
+import struct
+from XboxController import XboxController
+from ControllerInputs import AxisNames, ButtonNames
+from Profiler import profiled
+
+class ScriptedController(XboxController):
+	# Stands in for an XboxController, with inputs from a script of (time, state) events, where
+	# state is a dict of controller attributes such as {'LeftY': 1}. Events take effect when
+	# update is called with a time at or after theirs, and button callbacks fire on changes as
+	# they would for a real controller. Scripts can also be built by chaining at and press:
+	#   ScriptedController().press('Start', 0.5).at(2, LeftY = 1).press('Select', 10)
+	# Scripts are saved as a header followed by one (time, attribute index, value) record per
+	# changed attribute, which is also the format ControllerRecorder writes.
+	Attributes = AxisNames + ButtonNames
+	FileHeader = b"XBOXREC1"
+	EventFormat = struct.Struct("<dBd")
+
+	def __init__(self, events = ()):
+		super().__init__()
+		self.events = []
+		for time, state in events:
+			self.at(time, **state)
+		self.reset()
+
+	def at(self, time, **state):
+		for name in state:
+			if name not in ScriptedController.Attributes:
+				raise ValueError(f"Scripted Controller Attribute Error: {name} is not a controller input.")
+		self.events.append((time, state))
+		self.events.sort(key = lambda event: event[0])
+		return self
+
+	@staticmethod
+	def load(fileName):
+		with open(fileName, "rb") as file:
+			data = file.read()
+		if not data.startswith(ScriptedController.FileHeader):
+			raise ValueError(f"Scripted Controller File Error: {fileName} is not a controller recording.")
+		data = data[len(ScriptedController.FileHeader):]
+		data = data[:len(data) - len(data) % ScriptedController.EventFormat.size]
+		# Records at the same time are merged into one event, unless they change an attribute
+		# twice, such as a press and release within one update
+		events = []
+		for time, index, value in ScriptedController.EventFormat.iter_unpack(data):
+			name = ScriptedController.Attributes[index]
+			if not events or events[-1][0] != time or name in events[-1][1]:
+				events.append((time, dict()))
+			events[-1][1][name] = value
+		return ScriptedController(events)
+
+	def save(self, fileName):
+		with open(fileName, "wb") as file:
+			file.write(ScriptedController.FileHeader)
+			for time, state in self.events:
+				for name, value in state.items():
+					file.write(ScriptedController.EventFormat.pack(time, ScriptedController.Attributes.index(name), value))
+
+	def press(self, button, time, duration = 0.1):
+		return self.at(time, **{button: 1}).at(time + duration, **{button: 0})
+
+	def reset(self):
+		self._clearState()
+		self.Connected = True
+		self._nextEvent = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return
+
+	@profiled
+	def update(self, now = 0, *args):
+		while self._nextEvent < len(self.events) and self.events[self._nextEvent][0] <= now:
+			for name, value in self.events[self._nextEvent][1].items():
+				if name in ButtonNames:
+					value = int(not not value)
+					if value != getattr(self, name):
+						self.__setattr__(name, value)
+						self._onButton[2 * ButtonNames.index(name) + value]()
+				else:
+					self.__setattr__(name, value)
+			self._nextEvent += 1
@@ -8,6 +8,13 @@ except:
 	print("\nWARNING: Unable to import servo motor libraries. Continuing without servo motors.")
 	SCL_1 = 0
 	SDA_1 = 0
+	class I2CDevice:
+		def __enter__(self):
+			return self
+		def __exit__(self, *args):
+			return False
+		def write(self, buffer, start = 0, end = None):
+			return
 	class busio:
 		@staticmethod
 		def I2C(scl, sda):
@@ -18,6 +25,7 @@ except:
 			self.address = address
 			self.frequency = 0
 			self.channels = list(range(16))
+			self.i2c_device = I2CDevice()
 	class servo:
 		def __init__(self, channel, min_pulse, max_pulse, actuation_range):
 			self.channel = channel
@@ -30,16 +38,98 @@ except:
 			return servo(channel, min_pulse, max_pulse, actuation_range)
 
 class ServoController:
-	def __init__(self, address = 0x40):
+	LED0_ON_L = 0x06
+	FULL_OFF = 0x1000
+
+	def __init__(self, address = 0x40, bulk = False, i2cDevice = None):
 		self.i2c = busio.I2C(SCL_1, SDA_1)
 		self.pca = PCA9685(self.i2c, address = address)
 		self.pca.frequency = 333
+		self.frequency = self.pca.frequency or 333
 		self.servoList = dict()
 
+		# In bulk mode, servo angles are only staged, and update writes every changed channel's
+		# LED_ON/LED_OFF registers in one auto-increment transfer. The controller then owns all
+		# 16 channels, and channels without a servo are held fully off. Auto-increment is enabled
+		# by the PCA9685 library when the frequency is set.
+		self.bulk = bulk
+		self.i2cDevice = i2cDevice if i2cDevice is not None else self.pca.i2c_device
+		self._offCounts = [ServoController.FULL_OFF] * 16
+		self._writtenCounts = [None] * 16
+		self._buffer = bytearray(1 + 4 * 16)
+		self.transferCount = 0
+		self.channelWriteCount = 0
+
 	def addServo(self, channel, min_pulse = 500, max_pulse = 2500, actuation_range = 180):
-		s = servo.Servo(self.pca.channels[channel], min_pulse = min_pulse, max_pulse = max_pulse, actuation_range = actuation_range)
+		s = ServoChannel(self, channel, min_pulse = min_pulse, max_pulse = max_pulse, actuation_range = actuation_range)
 		self.servoList[channel] = s
 		return s
 	
 	def getServo(self, channel):
 		return self.servoList[channel]
+
+	def update(self):
+		if not self.bulk:
+			return 0
+		changed = [c for c in range(16) if self._offCounts[c] != self._writtenCounts[c]]
+		if not changed:
+			return 0
+
+		first = changed[0]
+		last = changed[-1]
+		buffer = self._buffer
+		buffer[0] = ServoController.LED0_ON_L + 4 * first
+		for c in range(first, last + 1):
+			off = self._offCounts[c]
+			buffer[4*(c - first) + 1] = 0
+			buffer[4*(c - first) + 2] = 0
+			buffer[4*(c - first) + 3] = off & 0xFF
+			buffer[4*(c - first) + 4] = off >> 8
+		with self.i2cDevice as i2c:
+			i2c.write(buffer, end = 4*(last - first + 1) + 1)
+
+		self._writtenCounts[first: last + 1] = self._offCounts[first: last + 1]
+		self.transferCount += 1
+		self.channelWriteCount += last - first + 1
+		return last - first + 1
+
+class ServoChannel:
+	# Same interface as adafruit_motor.servo.Servo. In bulk mode, setting the angle stages the
+	# PCA9685 counts the servo library would write, and ServoController.update sends them.
+	def __init__(self, controller, channel, min_pulse = 500, max_pulse = 2500, actuation_range = 180):
+		self.controller = controller
+		self.channel = channel
+		self.min_pulse = min_pulse
+		self.max_pulse = max_pulse
+		self.actuation_range = actuation_range
+		self._angle = None
+		self._servo = None if controller.bulk else servo.Servo(controller.pca.channels[channel], min_pulse = min_pulse, max_pulse = max_pulse, actuation_range = actuation_range)
+		self._minDuty = int((min_pulse * controller.frequency) / 1000000 * 0xFFFF)
+		self._dutyRange = int((max_pulse * controller.frequency) / 1000000 * 0xFFFF - self._minDuty)
+
+	def counts(self, angle):
+		# The 12-bit PCA9685 OFF count an angle is written as, by the same mapping the servo
+		# library uses, so angles with the same count drive the servo identically
+		dutyCycle = self._minDuty + int(angle / self.actuation_range * self._dutyRange)
+		return (dutyCycle + 1) >> 4
+
+	@property
+	def angle(self):
+		return self._angle
+
+	@angle.setter
+	def angle(self, value):
+		if value is None:
+			self._angle = None
+			if self._servo is not None:
+				self._servo.angle = None
+			else:
+				self.controller._offCounts[self.channel] = ServoController.FULL_OFF
+			return
+		if value < 0 or value > self.actuation_range:
+			raise ValueError("Angle out of range")
+		self._angle = value
+		if self._servo is not None:
+			self._servo.angle = value
+		else:
+			self.controller._offCounts[self.channel] = self.counts(value)
@@ -1,19 +1,27 @@
 
+import pickle
+import numpy as np
+from os import remove
 from time import time
+from math import pi
 from numpy import ndarray, rad2deg
 from Manipulator import Manipulator
-from PythonManipulator import PythonManipulator, chol, cholSolve
+from PythonManipulator import PythonManipulator, PoseCache, chol, cholSolve, ikinlm
 from ManipulatorAnimation import animate
+from WorkspaceMapper import WorkspaceMap, mapWorkspace
+from QuadrupedLeg import QuadrupedLeg
+from IkinTable import IkinTable
+from QuadrupedServo import QuadrupedServo
 
 def main():
 	manip = Manipulator()
-	manip.addRevoluteJoint([0, 0, 1, 0, 0, 0], [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0.2], [0.0405, 0.0405, 0.0009, 3.0, 3.0, 3.0])
-	manip.addRevoluteJoint([0, -1, 0, 0.4, 0, 0], [0, 0, 1, 0.1, 0, 1, 0, 0, -1, 0, 0, 0.4], [0.0017, 0.0017, 0.0002, 0.5, 0.5, 0.5])
-	manip.addRevoluteJoint([1, 0, 0, 0, 0.4, 0], [0, 0, 1, 0.3, 0, 1, 0, 0, -1, 0, 0, 0.4], [0.0017, 0.0017, 0.0002, 0.5, 0.5, 0.5])
-	manip.addRevoluteJoint([0, -1, 0, 0.4, 0, -0.4], [1, 0, 0, 0.4, 0, 1, 0, 0, 0, 0, 1, 0.485], [0.0013, 0.0013, 0.0002, 0.5, 0.5, 0.5])
-	manip.addRevoluteJoint([0, 0, 1, 0, -0.4, 0], [1, 0, 0, 0.4, 0, 1, 0, 0, 0, 0, 1, 0.655], [0.0013, 0.0013, 0.0002, 0.5, 0.5, 0.5])
-	manip.addRevoluteJoint([0, -1, 0, 0.74, 0, -0.4], [0, 0, 1, 0.463, 0, 1, 0, 0, -1, 0, 0, 0.74], [0.0006, 0.0006, 0.0001, 0.4, 0.4, 0.4])
-	manip.setHomeConfiguration([1, 0, 0, 0.526, 0, 0, -1, 0, 0, 1, 0, 0.74])
+	manip.addJoint([0, 0, 1, 0, 0, 0], [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0.2], [0.0405, 0.0405, 0.0009, 3.0, 3.0, 3.0])
+	manip.addJoint([0, -1, 0, 0.4, 0, 0], [0, 0, 1, 0.1, 0, 1, 0, 0, -1, 0, 0, 0.4], [0.0017, 0.0017, 0.0002, 0.5, 0.5, 0.5])
+	manip.addJoint([1, 0, 0, 0, 0.4, 0], [0, 0, 1, 0.3, 0, 1, 0, 0, -1, 0, 0, 0.4], [0.0017, 0.0017, 0.0002, 0.5, 0.5, 0.5])
+	manip.addJoint([0, -1, 0, 0.4, 0, -0.4], [1, 0, 0, 0.4, 0, 1, 0, 0, 0, 0, 1, 0.485], [0.0013, 0.0013, 0.0002, 0.5, 0.5, 0.5])
+	manip.addJoint([0, 0, 1, 0, -0.4, 0], [1, 0, 0, 0.4, 0, 1, 0, 0, 0, 0, 1, 0.655], [0.0013, 0.0013, 0.0002, 0.5, 0.5, 0.5])
+	manip.addJoint([0, -1, 0, 0.74, 0, -0.4], [0, 0, 1, 0.463, 0, 1, 0, 0, -1, 0, 0, 0.74], [0.0006, 0.0006, 0.0001, 0.4, 0.4, 0.4])
+	manip.setHome([1, 0, 0, 0.526, 0, 0, -1, 0, 0, 1, 0, 0.74])
 
 	q = [0.4880, -0.4626, -0.2681, -0.5295, 0.0664, 0.1018]
 	dq = [0.3147, 0.4058, -0.3730, 0.4134, 0.1324, -0.4025]
@@ -37,20 +45,227 @@ def main():
 	animate(p, 20, 'ManipulatorAnimation')
 
 def testIkin():
-	manip = Manipulator()
-	manip.addRevoluteJoint()
-	manip.addRevoluteJoint(w=[-1, 0, 0], p=[-0.0608, 0, 0])
-	manip.addRevoluteJoint(w=[1, 0, 0], p=[-0.0608, 0, 0.0889])
-	manip.setHomeConfiguration(M=[1, 0, 0, -0.0608, 0, 1, 0, 0, 0, 0, 1, 0.1842])
+	manip = legManipulator()
 
 	target = [0, -5, 0]
 	p = [0.0254 * target[0] - 0.0608, 0.0254 * target[1], 0.0254 * target[2]]
 	q1 = manip.ikin(p=p)
 
 	q2 = [0]*3
-	PythonManipulator.ikin(cManip=manip._cManip, cN=manip._cN, cP=p, cQ=q2)
+	PythonManipulator.ikin(cManip=manip._manip, cN=manip._cN, cP=p, cQ=q2)
+
+	# Results are new arrays unless written into out
+	q3 = q1.copy()
+	manip.ikin(p=[-0.07, -0.01, -0.16])
+	out = np.zeros(3)
+	passed = ArraysEqual(q1, q3, 0) and manip.ikin(p=p, out=out) is out and ArraysEqual(out, q3, 0)
+
+	print(f"Inverse Kinematics Test: {'PASS' if passed and ArraysEqual(q1, q2, 1e-9) else 'FAIL'}")
+
+def testIkinBatch():
+	manip = legManipulator()
+
+	targets = [[0, -5, 0], [1, -4, 1], [-1, -6, 0.5], [0.5, -3, -1]]
+	P = np.array([[0.0254 * t[0] - 0.0608, 0.0254 * t[1], 0.0254 * t[2]] for t in targets])
+	Q1 = np.array([manip.ikin(p=list(p)).copy() for p in P])
+
+	Q2 = np.zeros((len(P), manip.N))
+	PythonManipulator.ikinBatch(cManip=manip._manip, cN=manip._cN, P=P, Q=Q2)
+
+	Q3 = manip.ikinBatch(P)
+
+	# A library built from Manipulator.c solves the whole batch in one call
+	native = not manip._native or hasattr(manip._backend, "ikinBatch")
+
+	print(f"Batch Inverse Kinematics Test: {'PASS' if ArraysEqual(Q1.ravel(), Q2.ravel(), 1e-9) and ArraysEqual(Q1.ravel(), Q3.ravel(), 1e-9) and native else 'FAIL'}")
+
+def testAnalyticIkin():
+	passed = True
+	for legType in range(4):
+		leg = QuadrupedLeg(legType, QuadrupedServo(), QuadrupedServo(), QuadrupedServo(), ikinMode=QuadrupedLeg.IKIN_ANALYTIC)
+		for dx, dy, z in [(0, 0, -7), (1, 2, -6), (-1.5, -2, -5), (0.5, -3, -4)]:
+			x = leg.Home[0] + dx
+			y = leg.Home[1] + dy
+			q1 = leg.solvePose(x, y, z)
+			q2 = leg.manip.ikin(p=[0.0254 * a for a in (x, y, z)], q=q1)
+			passed = passed and ArraysEqual(q1, q2, 1e-9)
+
+		# Targets over the whole joint range, including those inboard of the hip 1 axis, must
+		# give joint angles within ±180° that reach the target
+		rng = np.random.default_rng(legType)
+		p0 = [0] * 6 + list(leg.manip.Home[3::4])
+		for q in rng.uniform([-pi, -pi / 2, -pi / 2], [pi, pi / 2, pi / 2], (200, 3)):
+			p = leg.manip.fkin(p0, q)[-3:].copy()
+			qa = leg.ikinAnalytic(p)
+			if qa is not None:
+				passed = passed and max(abs(a) for a in qa) <= pi and ArraysEqual(leg.manip.fkin(p0, qa)[-3:], p, 1e-9)
+	print(f"Analytic Inverse Kinematics Test: {'PASS' if passed else 'FAIL'}")
+
+def testIkinTable():
+	# Saved and reloaded tables must be continuous, and refined lookups anywhere in the box,
+	# including next to the edge of the workspace, must reach the target on the branch the
+	# iterative solver finds from the analytic solution, mostly without a full solve
+	passed = True
+	refined = 0
+	count = 0
+	fileName = "TestIkinTable.npy"
+	for legType in range(4):
+		leg = QuadrupedLeg(legType, QuadrupedServo(), QuadrupedServo(), QuadrupedServo())
+		IkinTable.build(leg, resolution=0.5).save(fileName)
+		leg.ikinTable = IkinTable.load(fileName)
+		leg.ikinMode = QuadrupedLeg.IKIN_TABLE
+		table = leg.ikinTable
+		passed = passed and all(np.abs(np.diff(table.table, axis=a)).max() < pi / 2 for a in range(3))
+
+		rng = np.random.default_rng(legType)
+		for p in rng.uniform(table.lower, table.upper, (200, 3)):
+			qa = leg.ikinAnalytic(p)
+			if qa is None:
+				continue
+			q1 = leg.solvePose(*(p / 0.0254)).copy()
+			refined += leg.manip.ikinIterations <= leg.ikinTableSteps
+			count += 1
+			q2, steps, residual = leg.manip.ikin(p, q1, Manipulator.SOLVER_LM, diagnostics=True, maxSteps=0)
+			q3 = leg.manip.ikin(p, qa)
+			passed = passed and residual < 1e-4 and ArraysEqual(q1, q3, 1e-2)
+		del leg.ikinTable, table
+	remove(fileName)
+	print(f"Inverse Kinematics Table Test: {'PASS' if passed and refined > 0.9 * count else 'FAIL'}")
 
-	print(f"Inverse Kinematics Test: {'PASS' if ArraysEqual(q1, q2, 1e-9) else 'FAIL'}")
+def testIkinLM():
+	# The LM solver should reach targets that the DLS solver reaches, in fewer steps
+	manip = legManipulator()
+	passed = True
+	for q in [[0.1, -0.2, 0.3], [-0.3, 0.4, -0.5], [0.2, 0.6, 0.8]]:
+		p = manip.fkin([0] * 6 + list(manip.Home[3::4]), q)[-3:].copy()
+		q0 = [qi + 0.2 for qi in q]
+		q1, steps1, residual1 = manip.ikin(p, q0, diagnostics=True)
+		q2, steps2, residual2 = manip.ikin(p, q0, solver=Manipulator.SOLVER_LM, diagnostics=True)
+		passed = passed and residual2 < 1e-4 and steps2 < 20 and (steps1 is None or steps2 <= steps1)
+	print(f"Levenberg-Marquardt Inverse Kinematics Test: {'PASS' if passed else 'FAIL'}")
+
+def testIkinCache():
+	# Cached prefix transforms and reused results must not change any solution
+	manip = legManipulator()
+	S = manip.S.ravel().tolist()
+	M = manip.Home.tolist()
+	cache = PoseCache(manip.N)
+	passed = True
+	q1 = [0.1, 0.3, -0.6]
+	q2 = list(q1)
+	for i in range(50):
+		p = [-0.07 + 0.001 * i, -0.01, -0.16]
+		ikinlm(S, M, manip.N, p, q1)
+		ikinlm(S, M, manip.N, p, q2, cache=cache)
+		passed = passed and q1 == q2
+		q = manip.ikin(p, q1)
+		passed = passed and ArraysEqual(manip.ikin(p, q1), q, 0) and manip.ikinIterations == 0
+
+	# Writing to the model through its views drops cached poses and results, so a repeated
+	# request is solved again and matches a manipulator that never cached anything
+	p = [-0.06, -0.01, -0.16]
+	q0 = [0.1, 0.3, -0.6]
+	for solver in (Manipulator.SOLVER_DLS, Manipulator.SOLVER_LM):
+		for view, index, delta in (("Home", 3, 0.01), ("S", (1, 5), 0.005)):
+			manip = legManipulator()
+			manip.ikin(p, q0, solver)
+			getattr(manip, view)[index] += delta
+			q = manip.ikin(p, q0, solver)
+			fresh = pickle.loads(pickle.dumps(manip))
+			passed = passed and manip.ikinIterations != 0 and ArraysEqual(q, fresh.ikin(p, q0, solver), 0)
+	print(f"Inverse Kinematics Cache Test: {'PASS' if passed and cache.hits > 0 else 'FAIL'}")
+
+def testWorkspaceMap():
+	# Manipulators survive pickling into worker processes, and every solved target lies in a
+	# reachable voxel
+	manip = Manipulator(PythonManipulator)
+	leg = legManipulator()
+	for S, M, G in zip(leg.S, leg.M, leg.G):
+		manip.addJoint(S, M, G)
+	manip.setHome(leg.Home)
+	copy = pickle.loads(pickle.dumps(manip))
+	passed = copy._backend is PythonManipulator and ArraysEqual(copy.ikin([-0.07, -0.01, -0.16]), manip.ikin([-0.07, -0.01, -0.16]), 0)
+
+	workspace = mapWorkspace(manip, resolution=0.05, jointLower=-1, jointUpper=1, jointSamples=500, targetSamples=50, workers=2, chunkSize=20)
+	workspace.save("TestWorkspaceMap.npz")
+	loaded = WorkspaceMap.load("TestWorkspaceMap.npz")
+	remove("TestWorkspaceMap.npz")
+	passed = (passed and workspace.reachCount.sum() == 500 and workspace.attempts.sum() == 50
+		and (workspace.reachCount[workspace.attempts > 0] > 0).all()
+		and (workspace.converged <= workspace.attempts).all() and workspace.iterationsKnown
+		and all(np.array_equal(getattr(workspace, field), getattr(loaded, field), equal_nan=True) for field in WorkspaceMap.Fields))
+
+	# Without step counts from the backend, iterations are unknown and can't be a criterion
+	stepless = Manipulator(SteplessManipulator)
+	for S, M, G in zip(leg.S, leg.M, leg.G):
+		stepless.addJoint(S, M, G)
+	stepless.setHome(leg.Home)
+	workspace = mapWorkspace(stepless, resolution=0.05, jointLower=-1, jointUpper=1, jointSamples=500, targetSamples=50, workers=2, chunkSize=20)
+	passed = passed and not workspace.iterationsKnown and workspace.contains([-0.07, -0.01, -0.16], minConvergence=0).shape == (1,)
+	try:
+		workspace.contains([-0.07, -0.01, -0.16], maxIterations=10)
+		passed = False
+	except ValueError:
+		pass
+	print(f"Workspace Map Test: {'PASS' if passed else 'FAIL'}")
+
+class SteplessManipulator:
+	# PythonManipulator without step counts, like libraries built without them
+	@staticmethod
+	def ikin(cManip, cN, cP, cQ):
+		PythonManipulator.ikin(cManip, cN, cP, cQ)
+
+	fkin = PythonManipulator.fkin
+	simStep = PythonManipulator.simStep
+
+def testNumbaIkin():
+	# The compiled backend must agree with the Python implementation exactly
+	try:
+		from NumbaManipulator import NumbaManipulator
+	except ImportError:
+		print("Numba Inverse Kinematics Test: SKIPPED")
+		return
+	manip = legManipulator()
+	passed = True
+	for target in [[0, -5, 0], [1, -4, 1], [-1, -6, 0.5], [0.5, -3, -1]]:
+		p = [0.0254 * target[0] - 0.0608, 0.0254 * target[1], 0.0254 * target[2]]
+		q1 = [0]*3
+		q2 = [0]*3
+		steps1 = PythonManipulator.ikin(cManip=manip._manip, cN=manip._cN, cP=p, cQ=q1)
+		steps2 = NumbaManipulator.ikin(cManip=manip._manip, cN=manip._cN, cP=p, cQ=q2)
+		passed = passed and steps1 == steps2 and ArraysEqual(q1, q2, 0)
+	print(f"Numba Inverse Kinematics Test: {'PASS' if passed else 'FAIL'}")
+
+def testNativeDynamics():
+	# Forward kinematics and dynamics of the library must agree with the Python implementation
+	manip = legManipulator()
+	if not manip._native:
+		print("Native Dynamics Test: SKIPPED")
+		return
+	manip.G[:] = [2e-5, 2e-5, 1e-5, 0.1, 0.1, 0.1]
+	python = Manipulator(PythonManipulator)
+	for S, M, G in zip(manip.S, manip.M, manip.G):
+		python.addJoint(S, M, G)
+	python.setHome(manip.Home)
+
+	passed = True
+	q = [0.1, -0.4, 0.7]
+	dq = [0.5, -1, 2]
+	u = [0.01, -0.02, 0.03]
+	p0 = [0.01, 0.02, 0.03, -0.0608, 0, 0.1, 0, 0.05, -0.1]
+	passed = passed and ArraysEqual(manip.fkin(p0, q), python.fkin(p0, q), 1e-9)
+	q1, dq1 = [x.copy() for x in manip.simStep(q, dq, u, 1e-3)]
+	q2, dq2 = python.simStep(q, dq, u, 1e-3)
+	passed = passed and ArraysEqual(q1, q2, 1e-9) and ArraysEqual(dq1, dq2, 1e-9)
+	print(f"Native Dynamics Test: {'PASS' if passed else 'FAIL'}")
+
+def legManipulator():
+	manip = Manipulator()
+	manip.addRevolute()
+	manip.addRevolute(w=[-1, 0, 0], p=[-0.0608, 0, 0])
+	manip.addRevolute(w=[1, 0, 0], p=[-0.0608, 0, 0.0889])
+	manip.setHome([1, 0, 0, -0.0608, 0, 1, 0, 0, 0, 0, 1, 0.1842])
+	return manip
 
 def testChol():
 	A = [	3.003217436238645, 1.659068572274807, 2.432642921790789, 1.279492052255865,
@@ -78,4 +293,12 @@ def ArraysEqual(a, b, tol):
 if __name__ == "__main__":
 	testChol()
 	testIkin()
+	testIkinBatch()
+	testAnalyticIkin()
+	testIkinTable()
+	testIkinLM()
+	testIkinCache()
+	testWorkspaceMap()
+	testNumbaIkin()
+	testNativeDynamics()
 	#main()
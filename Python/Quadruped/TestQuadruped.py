@@ -1,15 +1,474 @@
 
+import os
+import sys
+import json
+import struct
+import subprocess
+import numpy as np
+from time import sleep
+from glob import glob
+from sys import argv
 from Quadruped import Quadruped
+from QuadrupedServo import QuadrupedServo
+from QuadrupedGait import QuadrupedGait, GaitTrajectory, GaitInputs
+from ControllerRecorder import ControllerRecorder
+from QuadrupedBackends import NullServoController, Backends, registerBackend
+from OrigamiController import OrigamiController
+from OrigamiModule import OrigamiModule
+from OrigamiMotor import OrigamiMotor
+from OrigamiPidExecutor import OrigamiPidExecutor
+from FlightRecorder import FlightRecorder
+from IoWorker import DoubleBuffer, IoWorker
+from LoopScheduler import LoopScheduler
+from Profiler import ProfileScope
+from ScriptedController import ScriptedController
+from ServoController import ServoController
 from XboxController import XboxController
 
 def main():
 	print("\nStarting Quadruped...")
+	# With --record or --replay followed by a file name, controller input is saved to or
+	# replayed from the file
 	robot = Quadruped()
-	with XboxController() as xbox:
+	xbox = XboxController()
+	if "--record" in argv:
+		xbox = ControllerRecorder(xbox, argv[argv.index("--record") + 1])
+	elif "--replay" in argv:
+		xbox = ScriptedController.load(argv[argv.index("--replay") + 1])
+	with xbox:
 		xbox.onButtonPressed('X', xbox.printState)
 		xbox.onButtonPressed('Y', robot.printState)
 		xbox.onButtonPressed('B', robot.nextGait)
+		xbox.onButtonPressed('RB', robot.dumpFlightRecord)
 		robot.run(xbox = xbox)
 
+class FakeI2CDevice:
+	# Stands in for adafruit_bus_device's I2CDevice and records the bytes of every transfer
+	def __init__(self, record = False):
+		self.record = record
+		self.writes = []
+		self.lastWrite = b''
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+	def write(self, buffer, start = 0, end = None):
+		self.lastWrite = bytes(buffer[start:end])
+		if self.record:
+			self.writes.append(self.lastWrite)
+
+def testBulkServoWrites():
+	bus = FakeI2CDevice(record = True)
+	controller = ServoController(bulk = True, i2cDevice = bus)
+	controller.frequency = 333
+	servos = [controller.addServo(channel) for channel in (0, 1, 2)]
+	for s in servos:
+		s.angle = 90
+
+	# First update writes all 16 channels, with unused channels fully off
+	controller.update()
+	counts = (90 * int(2500 * 333 / 1000000 * 0xFFFF - int(500 * 333 / 1000000 * 0xFFFF)) // 180 + int(500 * 333 / 1000000 * 0xFFFF) + 1) >> 4
+	expected = bytes([0x06] + [0, 0, counts & 0xFF, counts >> 8] * 3 + [0, 0, 0x00, 0x10] * 13)
+	passed = bus.writes == [expected]
+
+	# Unchanged channels are skipped, and only the changed span is written
+	servos[1].angle = 0
+	controller.update()
+	controller.update()
+	counts = (int(500 * 333 / 1000000 * 0xFFFF) + 1) >> 4
+	passed = passed and bus.writes[1:] == [bytes([0x0A, 0, 0, counts & 0xFF, counts >> 8])]
+
+	print(f"Bulk Servo Write Test: {'PASS' if passed else 'FAIL'}")
+
+class FakeWebotsMotor:
+	def __init__(self):
+		self.positions = []
+
+	def setPosition(self, position):
+		self.positions.append(position)
+
+def testServoDedup():
+	# Commands that don't change the PCA9685 counts, which are offset by the minimum pulse and
+	# truncated, or the Webots position, are counted and not sent. 90.01 degrees is past the
+	# count boundary at 90.005, and 90.02 isn't past the next.
+	bus = FakeI2CDevice(record = True)
+	controller = ServoController(bulk = True, i2cDevice = bus)
+	controller.frequency = 333
+	channel = controller.addServo(0)
+	motor = FakeWebotsMotor()
+	servo = QuadrupedServo(offset = 90, physicalServo = channel, webotsServo = motor)
+	minDuty = int(500 * 333 / 1000000 * 0xFFFF)
+	dutyRange = int(2500 * 333 / 1000000 * 0xFFFF - minDuty)
+	counts = [(minDuty + int(a / 180 * dutyRange) + 1) >> 4 for a in (90, 90.01, 100)]
+	for angle in (0, 0, 0.01, 0.02, 10, 10):
+		servo.setAngle(angle)
+		controller.update()
+	passed = [channel.counts(a) for a in (90, 90.01, 90.02, 100)] == counts[:2] + counts[1:]
+	passed = passed and [write[3] | write[4] << 8 for write in bus.writes] == counts and servo.physicalAngle == channel.angle == 100
+	passed = passed and servo.physicalWrites == 3 and servo.webotsWrites == 4 and servo.suppressedWrites == 5 and len(motor.positions) == 4
+	print(f"Servo Command Dedup Test: {'PASS' if passed else 'FAIL'}")
+
+def testGaitTables():
+	# Compiled trajectories match the trajectory functions at any phase, with either
+	# interpolation, and unknown interpolations are rejected
+	passed = True
+	for trajectory in (GaitTrajectory.walk, GaitTrajectory.trot):
+		for interpolation in ("linear", "cubic"):
+			gait = QuadrupedGait(trajectory)
+			gait.compile(interpolation = interpolation)
+			for phase in np.linspace(-3, 9, 1001):
+				u, v = gait.evaluate(phase)
+				expected = np.array([trajectory(phase, i) for i in range(4)])
+				passed = passed and u.shape == (4,) and np.abs(np.stack((u, v), axis = 1) - expected).max() < 1e-3
+	try:
+		QuadrupedGait().compile(interpolation = "nearest")
+		passed = False
+	except ValueError:
+		pass
+	print(f"Gait Table Test: {'PASS' if passed else 'FAIL'}")
+
+def testGaitCycle():
+	# Solving a gait cycle moves no servos, and matches solving each sample on its own
+	robot = Quadruped(headless = True)
+	inputs = GaitInputs(LeftX = 0.5, LeftY = -0.5, RightTrigger = 0.5)
+	gait = robot.Gaits[0]
+	angles = robot.solveGaitCycle(gait, inputs, samples = 16)
+	passed = angles.shape == (4, 16, 3) and all(joint.physicalWrites == 0 and joint.webotsWrites == 0 for joint in robot._servos)
+
+	x, y, z = robot.gaitTargets(inputs, 5 / 16 * 4 / gait.stepFrequency, gait)
+	for i, leg in enumerate(robot.Legs):
+		q = leg.solvePose(x[i], y[i], z[i], np.radians(angles[i, 4]))
+		passed = passed and np.abs(np.degrees(q) - angles[i, 5]).max() < 0.1
+
+	# Cycles default to the gait's own period, 2 steps for a trot and 4 for trajectories without
+	# one, and other periods must be multiples of it
+	trot = robot.Gaits[1]
+	angles = robot.solveGaitCycle(trot, inputs, samples = 16)
+	passed = passed and trot.period == 2 and np.array_equal(robot.solveGaitCycle(trot, inputs, samples = 32, period = 4)[:, :16], angles)
+	passed = passed and QuadrupedGait(lambda t, i: (0, 0)).period == 4
+	for check in (lambda: robot.solveGaitCycle(trot, inputs, period = 3), lambda: trot.compile(period = 1)):
+		try:
+			check()
+			passed = False
+		except ValueError:
+			pass
+
+	print(f"Gait Cycle Test: {'PASS' if passed else 'FAIL'}")
+
+def testScheduler():
+	# Ticks fall on absolute deadlines, a late tick counts as one overrun and drops the whole
+	# periods it missed, and a fixed-rate run times every stage, Webots separately from servos
+	scheduler = LoopScheduler(100)
+	times = [scheduler.wait()[0] for _ in range(5)]
+	sleep(0.035)
+	now, timeStep = scheduler.wait()
+	passed = np.allclose(times, [0.01, 0.02, 0.03, 0.04, 0.05]) and timeStep > 0.03 and scheduler.overruns == 1
+	passed = passed and scheduler.skippedTicks >= 2 and abs(now - 0.01 * (scheduler.ticks + scheduler.skippedTicks)) < 1e-9
+
+	robot = Quadruped(headless = True)
+	ticks = robot.run(ScriptedController().press('Start', 0.1).at(0.5, LeftY = 1), rate = 200, duration = 1.6)
+	passed = passed and ticks == robot.scheduler.ticks and ticks + robot.scheduler.skippedTicks == 320 and set(robot.scheduler.stageTimes) == set(LoopScheduler.Stages)
+	passed = passed and 'webots' in LoopScheduler.Stages and all(t > 0 for t in robot.scheduler.stageTimes.values())
+	print(f"Loop Scheduler Test: {'PASS' if passed else 'FAIL'}")
+
+def testIoWorkers():
+	# Workers flush only newly published commands, survive flush errors, and a threaded run
+	# writes the same servo registers and motor reports as an unthreaded one, leaving no
+	# workers behind
+	bus = FakeI2CDevice(record = True)
+	controller = ServoController(bulk = True, i2cDevice = bus)
+	channels = [controller.addServo(channel) for channel in (0, 1, 2)]
+	flushed = []
+	def flush(angles):
+		if angles[0] < 0:
+			raise ValueError("Negative Angle")
+		for channel, angle in zip(channels, angles):
+			channel.angle = float(angle)
+		controller.update()
+		flushed.append(list(angles))
+	buffer = DoubleBuffer(3)
+	worker = IoWorker("Test", flush = flush, buffer = buffer)
+	worker.start()
+	for angles in ([-1, 0, 0], [10, 20, 30], [40, 50, 60]):
+		buffer.publish(angles)
+		worker.notify()
+		for _ in range(1000):
+			if worker.flushCount == buffer.sequence:
+				break
+			sleep(0.001)
+	worker.notify()
+	sleep(0.01)
+	worker.stop()
+	passed = flushed == [[10, 20, 30], [40, 50, 60]] and worker.flushCount == 3 and isinstance(worker.error, ValueError)
+	passed = passed and not worker.is_alive() and [channel.angle for channel in channels] == [40, 50, 60] and len(bus.writes) == 2
+
+	# Threaded workers only send the latest commands, so they may skip ticks, but every state
+	# they leave the PCA9685 registers in, and every motor report they send, comes from a tick
+	# of the unthreaded run, and both runs end in the same state
+	script = ScriptedController().press('Start', 0.5).at(2, LeftY = 1).at(2.5, DpadY = 1).at(3, DpadY = 0).press('Select', 4)
+	_, registers, reports = runOnFakeDevices(script, threadedIo = False)
+	script.reset()
+	robot, threadedRegisters, threadedReports = runOnFakeDevices(script, threadedIo = True)
+	passed = passed and len(set(registers)) > 2 and set(threadedRegisters) <= set(registers) and threadedRegisters[-1] == registers[-1]
+	passed = passed and len(set(reports)) > 1 and set(threadedReports) <= set(reports) and threadedReports[-1] == reports[-1]
+	passed = passed and not any(worker.is_alive() for worker in robot._ioWorkers) and not any(servo.deferPhysical for servo in robot._servos)
+	print(f"I/O Worker Test: {'PASS' if passed else 'FAIL'}")
+
+def runOnFakeDevices(script, threadedIo):
+	# Runs the script on a robot whose servo controller and Origami Module write to fake
+	# devices. Returns the PCA9685 channel registers after each I2C transfer, and each USB
+	# report sent, as bytes, with the robot.
+	bus = FakeI2CDevice(record = True)
+	usb = FakeHidDevice([0] * 32)
+	backends = dict(Backends)
+	registerBackend('servo', lambda: ServoController(bulk = True, i2cDevice = bus), NullServoController)
+	registerBackend('origami', lambda: OrigamiController(usbDevice = usb), backends['origami'][1])
+	try:
+		robot = Quadruped(threadedIo = threadedIo, backends = ('servo', 'origami'))
+		robot.runHeadless(script, duration = 10)
+	finally:
+		Backends.update(backends)
+	registers = []
+	image = bytearray(4 * 16)
+	for write in bus.writes:
+		start = write[0] - ServoController.LED0_ON_L
+		image[start: start + len(write) - 1] = write[1:]
+		registers.append(bytes(image))
+	return robot, registers, usb.writes
+
+def testHeadlessRun():
+	# Press Start to stand, step in place after standing for a second, walk forward, and stop on Select
+	robot = Quadruped(headless = True)
+	script = ScriptedController().press('Start', 0.5).at(2, LeftY = 1).press('Select', 4)
+	pressed = []
+	script.onButtonPressed('Start', lambda: pressed.append('Start'))
+	times, angles = robot.runHeadless(script, duration = 10, timeStep = 0.01)
+	passed = pressed == ['Start'] and angles.shape == (len(times), 12) and np.allclose(times, 0.01 * np.arange(len(times)))
+	passed = passed and abs(times[-1] - 4) < 1e-9 and not angles[times < 0.5].any()
+	standing = angles[(times > 0.5) & (times < 1.5)]
+	passed = passed and standing.any() and np.ptp(standing, axis = 0).max() == 0 and np.ptp(angles[times > 2], axis = 0).max() > 5
+
+	# The same script replays to the same joint commands, and a duration ends the run
+	script.reset()
+	passed = passed and np.array_equal(robot.runHeadless(script, duration = 10)[1], angles)
+	script.reset()
+	times, _ = robot.runHeadless(script, duration = 1)
+	passed = passed and len(times) == 101 and robot.recording is None
+
+	print(f"Headless Run Test: {'PASS' if passed else 'FAIL'}")
+
+def testControllerReplay():
+	# Recording a session and replaying it gives the same controller input and joint commands
+	robot = Quadruped(headless = True)
+	script = ScriptedController().press('Start', 0.5).at(2, LeftX = 0.25, LeftY = 1).at(2.5, RightTrigger = 0.7).press('Select', 3)
+	with ControllerRecorder(script, "ControllerReplayTest.bin") as xbox:
+		angles = robot.runHeadless(xbox, duration = 10)[1]
+	replay = ScriptedController.load("ControllerReplayTest.bin")
+	os.remove("ControllerReplayTest.bin")
+	passed = xbox.eventCount == 6 and replay.events == [(0.5, {'Start': 1}), (0.6, {'Start': 0}), (2, {'LeftX': 0.25, 'LeftY': 1}), (2.5, {'RightTrigger': 0.7}), (3, {'Select': 1})]
+
+	pressed = []
+	replay.onButtonPressed('Start', lambda: pressed.append('Start'))
+	passed = passed and np.array_equal(robot.runHeadless(replay, duration = 10)[1], angles) and pressed == ['Start']
+
+	# A press and release between two updates is recorded, and replayed, as both events
+	script = ScriptedController().press('B', 0.501, 0.002)
+	with ControllerRecorder(script, "ControllerReplayTest.bin") as xbox:
+		xbox.onButtonPressed('B', lambda: pressed.append('B'))
+		for now in (0.5, 0.51):
+			xbox.update(now)
+	replay = ScriptedController.load("ControllerReplayTest.bin")
+	os.remove("ControllerReplayTest.bin")
+	replay.onButtonPressed('B', lambda: pressed.append('B'))
+	replay.onButtonReleased('B', lambda: pressed.append('b'))
+	replay.update(0.51)
+	passed = passed and pressed == ['Start', 'B', 'B', 'b'] and replay.events == [(0.51, {'B': 1}), (0.51, {'B': 0})] and not replay.B
+
+	print(f"Controller Replay Test: {'PASS' if passed else 'FAIL'}")
+
+def testFlightRecorder():
+	# The ring buffer keeps the last ticks of a run, and is dumped oldest first on demand and
+	# when run raises
+	robot = Quadruped(headless = True, flightRecorderTicks = 150)
+	script = ScriptedController().press('Start', 0.5).at(2, LeftY = 1).press('Select', 4)
+	times, angles = robot.runHeadless(script, duration = 10)
+	robot.dumpFlightRecord("FlightRecorderTest.npy")
+	ticks = FlightRecorder.load("FlightRecorderTest.npy")
+	passed = len(ticks) == 150 and np.allclose(ticks['time'], times[-150:]) and np.allclose(ticks['joints'], angles[-150:], atol = 1e-4)
+	passed = passed and (ticks['state'] == 3).all() and (ticks['ikinIterations'] >= 0).all() and ticks['axes'][-1, 1] == 1
+	passed = passed and ticks['buttons'][-1] == 1 << 7 and np.ptp(ticks['phase']) > 1
+	del ticks
+	os.remove("FlightRecorderTest.npy")
+
+	class FailingController(ScriptedController):
+		def update(self, now = 0, *args):
+			if now >= 1:
+				raise RuntimeError("Controller Failure")
+			super().update(now, *args)
+	previous = set(glob("FlightRecord-*.npy"))
+	try:
+		robot.runHeadless(FailingController(), duration = 10)
+		passed = False
+	except RuntimeError:
+		pass
+	dumps = set(glob("FlightRecord-*.npy")) - previous
+	passed = passed and len(dumps) == 1 and FlightRecorder.load(next(iter(dumps)))['time'][-1] == 0.99
+	for fileName in dumps:
+		os.remove(fileName)
+	print(f"Flight Recorder Test: {'PASS' if passed else 'FAIL'}")
+
+def testProfiler():
+	# Histogram percentiles are bucket edges, capped at the slowest call
+	scope = ProfileScope("test")
+	for ns in [100] * 90 + [3000] * 9 + [50000]:
+		scope.add(ns)
+	passed = scope.percentile(50) == 128 and scope.percentile(95) == 4096 and scope.percentile(100) == 50000
+
+	# A headless run with profiling enabled exports every instrumented entry point
+	script = "from Quadruped import Quadruped; from ScriptedController import ScriptedController; Quadruped(headless = True).runHeadless(ScriptedController().press('Start', 0.5), duration = 3)"
+	subprocess.run([sys.executable, "-c", script], env = {**os.environ, "QUADRUPED_PROFILE": "ProfilerTest.json"}, capture_output = True)
+	with open("ProfilerTest.json") as file:
+		scopes = json.load(file)
+	os.remove("ProfilerTest.json")
+	passed = passed and scopes["ScriptedController.update"]["count"] == 301 and scopes["QuadrupedServo.setAngle"]["count"] > 0
+	passed = passed and all(name in scopes for name in ("Quadruped.runGait", "Manipulator.ikin", "OrigamiController.update", "WebotsServoController.update"))
+	print(f"Profiler Test: {'PASS' if passed else 'FAIL'}")
+
+def testBackendSelection():
+	# Unselected drivers are replaced by stand-ins, every backend's startup is timed, and
+	# unknown backends are rejected before any driver is opened. The Origami Module is opened
+	# on a fake USB device.
+	usb = FakeHidDevice([0] * 32)
+	backends = dict(Backends)
+	registerBackend('origami', lambda: OrigamiController(usbDevice = usb), backends['origami'][1])
+	try:
+		robot = Quadruped(backends = ('origami',))
+	finally:
+		Backends.update(backends)
+	passed = isinstance(robot.ServoController, NullServoController) and robot.WebotsController.simStep == 0 and robot.OrigamiController._usbDevice is usb
+	passed = passed and set(robot.startupTimes) == {'servo', 'webots', 'origami', 'kinematics'}
+	try:
+		Quadruped(backends = ('servos',))
+		passed = False
+	except ValueError:
+		pass
+	print(f"Backend Selection Test: {'PASS' if passed else 'FAIL'}")
+
+class FakeHidDevice:
+	# Answers every write with a report holding the low bytes of the given encoder counts
+	def __init__(self, counts):
+		self.counts = counts
+		self.writes = []
+
+	def write(self, data):
+		self.writes.append(bytes(data))
+
+	def read(self, size):
+		return bytes(b for count in self.counts for b in (count & 0xFF, 0))
+
+def testOrigamiController():
+	# Encoder counts are unwrapped across the 8-bit boundary, in steps of at most 16 counts, and
+	# motor commands are sent in every transfer
+	usb = FakeHidDevice([250] * 32)
+	origami = OrigamiController(usbDevice = usb)
+	origami.setMotorPwm(3, -0.5)
+	usb.counts = [250 + 11] * 16 + [250 - 40] * 16
+	origami.update()
+	passed = list(origami.getMotorPositions()) == [261] * 16 + [234] * 16 and usb.writes[-1][7:9] == bytes([0x0C, 0x00])
+	origami.update()
+	passed = passed and origami.getMotorPosition(0) == 261 and origami.getMotorPosition(31) == 218
+
+	# Started, transfers run on the worker thread and update decodes the latest report
+	origami.start()
+	usb.counts = [300] * 32
+	for _ in range(1000):
+		origami.update()
+		if origami.getMotorPosition(0) == 300:
+			break
+		sleep(0.001)
+	origami.stop()
+	passed = passed and origami.getMotorPosition(0) == 300 and origami.worker is None
+	print(f"Origami Controller Test: {'PASS' if passed else 'FAIL'}")
+
+def testOrigamiPid():
+	# Matches OrigamiModule.runPid away from saturation, holds the integral while saturated,
+	# and runs at its rate on its own thread, leaving the motors stopped
+	usb = FakeHidDevice([100] * 32)
+	origami = OrigamiController(usbDevice = usb)
+	module = OrigamiModule(*(OrigamiMotor(origami, channel) for channel in (5, 7, 6)))
+	pid = OrigamiPidExecutor([module], rate = 500, kp = [2e-4, 2e-4, 1e-4])
+	pid.setTarget(module, [10, -20, 1e6], 0.1)
+	pid.step()
+	origami.update()
+	e = np.array([10, -20, 1e6])
+	passed = np.allclose(pid.effort[:2], 1.95 * (0.1 + 2e-4 * (e[:2] + 1e-2 * e[:2]))) and pid.effort[2] == 1 and pid.integral[2] == 0
+	passed = passed and usb.writes[-1][13:15] == bytes([0x07, 0xFF])
+
+	pid.start()
+	sleep(0.2)
+	pid.stop()
+	passed = passed and pid.scheduler.ticks > 50 and origami.worker is None and not any(usb.writes[-1])
+	print(f"Origami PID Executor Test: {'PASS' if passed else 'FAIL'}")
+
+def testXboxEvents():
+	# Joystick events from a pipe: axes take their latest value, and every button event fires
+	if os.name == "nt":
+		return
+	xbox = XboxController()
+	xbox._fid, fid = os.pipe()
+	os.set_blocking(xbox._fid, False)
+	xbox.Connected = True
+	pressed = []
+	xbox.onButtonPressed('A', lambda: pressed.append(1))
+	xbox.onButtonReleased('A', lambda: pressed.append(0))
+	events = [(0, 1, 2, 0), (0, -0x7FFF, 2, 1), (0, 1, 1, 0), (0, 0, 1, 0), (0, 0x7FFF, 2, 0), (0, 1, 1, 0), (0, 1, 1, 9), (0, 0x7FFF, 2, 5)] * 20
+	os.write(fid, b''.join(struct.pack("IhBB", *event) for event in events))
+	xbox.update()
+	passed = pressed == [1, 0, 1] * 20 and xbox.A == 1 and xbox.LeftX > 0.999 and xbox.LeftY > 0.999 and xbox.RightTrigger == 1
+
+	os.close(fid)
+	xbox.update()
+	passed = passed and xbox.Connected
+	os.close(xbox._fid)
+
+	# Events are read in the same update that connects, and button callbacks see the axes as
+	# they were when the button changed
+	xbox = XboxController()
+	fid = None
+	def connect():
+		nonlocal fid
+		xbox._fid, fid = os.pipe()
+		os.set_blocking(xbox._fid, False)
+		os.write(fid, b''.join(struct.pack("IhBB", *event) for event in [(0, 0x7FFF, 2, 0), (0, 1, 1, 0), (0, -0x7FFF, 2, 0), (0, 0, 1, 0)]))
+		xbox.Connected = True
+	xbox._connect = connect
+	axes = []
+	xbox.onButtonPressed('A', lambda: axes.append(xbox.LeftX))
+	xbox.onButtonReleased('A', lambda: axes.append(xbox.LeftX))
+	xbox.update()
+	passed = passed and len(axes) == 2 and axes[0] > 0.999 and axes[1] < -0.999 and xbox.LeftX < -0.999 and xbox.A == 0
+	os.close(fid)
+	os.close(xbox._fid)
+	print(f"Xbox Controller Event Test: {'PASS' if passed else 'FAIL'}")
+
 if __name__ == "__main__":
-	main()
+	if "test" in argv[1:]:
+		testBulkServoWrites()
+		testServoDedup()
+		testGaitTables()
+		testGaitCycle()
+		testScheduler()
+		testIoWorkers()
+		testHeadlessRun()
+		testControllerReplay()
+		testFlightRecorder()
+		testProfiler()
+		testBackendSelection()
+		testOrigamiController()
+		testOrigamiPid()
+		testXboxEvents()
+	else:
+		main()
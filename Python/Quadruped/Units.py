@@ -0,0 +1,13 @@
+from math import pi
+
+# Unit conversions and angle helpers shared by the leg model and its IK tables. They work on
+# scalars and NumPy arrays alike.
+
+def inch2meter(x):
+	return 0.0254 * x
+
+def meter2inch(x):
+	return x / 0.0254
+
+def wrapAngle(x):
+	return (x + pi) % (2 * pi) - pi
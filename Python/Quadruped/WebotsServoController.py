@@ -1,21 +1,31 @@
 
 from time import time
+from Profiler import profiled
 
-try:
-	from controller import Robot as Webot
-except:
-	print("\nWARNING: Unable to import Webots library. Continuing without Webots functionality.")
-	class Webot:
-		def getDevice(self, jointName):
-			return None
-		def getBasicTimeStep(self):
-			return 0
-		def step(self, timeStep):
-			return False
+class NullWebot:
+	# Stands in for a Webots robot with no devices. With a basic time step (ms), the controller
+	# runs on simulated time without a simulator, and otherwise on wall-clock time.
+	def __init__(self, basicTimeStep = 0):
+		self.basicTimeStep = basicTimeStep
+	def getDevice(self, jointName):
+		return None
+	def getBasicTimeStep(self):
+		return self.basicTimeStep
+	def step(self, timeStep):
+		return False
+
+def openWebot():
+	# The Webots library is only imported when a controller connects to the simulator
+	try:
+		from controller import Robot
+	except:
+		print("\nWARNING: Unable to import Webots library. Continuing without Webots functionality.")
+		return NullWebot()
+	return Robot()
 
 class WebotsServoController:
-	def __init__(self):
-		self.webot = Webot()
+	def __init__(self, webot = None):
+		self.webot = webot if webot is not None else openWebot()
 		self.simStep = int(self.webot.getBasicTimeStep())
 		self.reset()
 
@@ -23,6 +33,7 @@ class WebotsServoController:
 		self.simTime = int(0)
 		self.startTime = time()
 
+	@profiled
 	def update(self):
 		self.simTime = self.simTime + self.simStep if self.simStep > 0 else round(1000 * (time() - self.startTime))
 		return self.webot.step(self.simStep) == -1
@@ -0,0 +1,180 @@
+import numpy as np
+from sys import argv
+from math import pi
+from concurrent.futures import ProcessPoolExecutor
+from Manipulator import Manipulator
+from PythonManipulator import jacobPoseBatch
+from QuadrupedGait import GaitInputs
+
+# Maps the reachable workspace of a Manipulator and how well ikin converges across it, as a
+# voxel grid saved with np.savez_compressed. Usage, mapping the front right leg:
+#   python WorkspaceMapper.py [output.npz] [--quick] [--lm]
+
+class WorkspaceMap:
+	# For each voxel: reachCount is the number of joint space samples whose end effector falls
+	# in the voxel and manipulability is their mean sqrt(det(Ja * Ja')), and attempts, converged
+	# and iterations are totals over the ikin solves of targets in the voxel. Iterations are NaN
+	# everywhere when the backend didn't report step counts.
+	Fields = ("reachCount", "manipulability", "attempts", "converged", "iterations")
+
+	def __init__(self, lower, upper, resolution, reachCount, manipulability, attempts, converged, iterations):
+		self.lower = np.array(lower, dtype = np.float64)
+		self.upper = np.array(upper, dtype = np.float64)
+		self.resolution = float(resolution)
+		self.reachCount = reachCount
+		self.manipulability = manipulability
+		self.attempts = attempts
+		self.converged = converged
+		self.iterations = iterations
+		self.shape = np.array(reachCount.shape)
+
+	@property
+	def convergenceRate(self):
+		with np.errstate(invalid = 'ignore'):
+			return self.converged / self.attempts
+
+	@property
+	def meanIterations(self):
+		with np.errstate(invalid = 'ignore'):
+			return self.iterations / self.attempts
+
+	@staticmethod
+	def load(fileName):
+		with np.load(fileName) as data:
+			return WorkspaceMap(data["lower"], data["upper"], data["resolution"], *(data[field] for field in WorkspaceMap.Fields))
+
+	def save(self, fileName):
+		np.savez_compressed(fileName, lower = self.lower, upper = self.upper, resolution = self.resolution, **{field: getattr(self, field) for field in WorkspaceMap.Fields})
+
+	def voxels(self, P):
+		# Voxel indices of the points P, and which of them are inside the grid
+		i = np.floor((np.atleast_2d(P) - self.lower) / self.resolution).astype(int)
+		inside = ((i >= 0) & (i < self.shape)).all(axis = 1)
+		return np.where(inside[:, None], i, 0), inside
+
+	@property
+	def iterationsKnown(self):
+		return not np.isnan(self.iterations).any()
+
+	def contains(self, P, minConvergence = 1, maxIterations = None):
+		# Whether each point lies in a voxel where every (or minConvergence of) sampled solve
+		# converged, in at most maxIterations steps on average
+		i, inside = self.voxels(P)
+		rate = self.convergenceRate[i[:, 0], i[:, 1], i[:, 2]]
+		good = inside & (rate >= minConvergence)
+		if maxIterations is not None:
+			if not self.iterationsKnown:
+				raise ValueError("Workspace Map Error: maxIterations can't be checked, since the backend that mapped the workspace doesn't report step counts.")
+			good &= self.meanIterations[i[:, 0], i[:, 1], i[:, 2]] <= maxIterations
+		return good
+
+def mapWorkspace(manip, lower = None, upper = None, resolution = 0.01,
+	jointLower = -pi, jointUpper = pi, jointSamples = 100000, targetSamples = 20000,
+	q0 = None, warmStartSpread = 0.2, solver = Manipulator.SOLVER_DLS, tol = 1e-4,
+	workers = None, chunkSize = 4096, seed = 0):
+	# Samples joint space uniformly between jointLower and jointUpper for reachability and
+	# manipulability, then solves ikin for the end effector positions of the first
+	# targetSamples samples. Each solve starts from q0 if given, and otherwise from the sampled
+	# joint vector perturbed by warmStartSpread radians, like a warm start from the previous
+	# control tick. Without bounds, the grid covers the sampled end effector positions.
+	rng = np.random.default_rng(seed)
+	Q = rng.uniform(jointLower, jointUpper, (jointSamples, manip.N))
+
+	with ProcessPoolExecutor(workers) as executor:
+		chunks = [Q[i:i+chunkSize] for i in range(0, len(Q), chunkSize)]
+		results = list(executor.map(sampleJoints, [manip] * len(chunks), chunks))
+		P = np.concatenate([r[0] for r in results])
+		w = np.concatenate([r[1] for r in results])
+
+		targets = P[:targetSamples]
+		if q0 is None:
+			Q0 = Q[:targetSamples] + rng.normal(0, warmStartSpread, (len(targets), manip.N))
+		else:
+			Q0 = np.broadcast_to(np.asarray(q0, dtype = np.float64), (len(targets), manip.N))
+		chunks = [slice(i, i+chunkSize) for i in range(0, len(targets), chunkSize)]
+		results = list(executor.map(solveTargets, [manip] * len(chunks), [targets[c] for c in chunks], [Q0[c] for c in chunks], [solver] * len(chunks), [tol] * len(chunks)))
+		converged = np.concatenate([r[0] for r in results])
+		iterations = np.concatenate([r[1] for r in results])
+
+	if lower is None:
+		lower = P.min(axis = 0) - resolution
+	if upper is None:
+		upper = P.max(axis = 0) + resolution
+	lower = np.asarray(lower, dtype = np.float64)
+	shape = np.ceil((np.asarray(upper) - lower) / resolution).astype(int)
+	workspace = WorkspaceMap(lower, lower + shape * resolution, resolution,
+		np.zeros(shape, dtype = np.int32), np.zeros(shape, dtype = np.float32),
+		np.zeros(shape, dtype = np.int32), np.zeros(shape, dtype = np.int32), np.zeros(shape, dtype = np.float32))
+
+	i, inside = workspace.voxels(P)
+	i = tuple(i[inside].T)
+	np.add.at(workspace.reachCount, i, 1)
+	np.add.at(workspace.manipulability, i, w[inside])
+	with np.errstate(invalid = 'ignore'):
+		workspace.manipulability /= workspace.reachCount
+
+	i, inside = workspace.voxels(targets)
+	i = tuple(i[inside].T)
+	np.add.at(workspace.attempts, i, 1)
+	np.add.at(workspace.converged, i, converged[inside])
+	if np.isnan(iterations).any():
+		workspace.iterations[:] = np.nan
+	else:
+		np.add.at(workspace.iterations, i, iterations[inside])
+	return workspace
+
+def sampleJoints(manip, Q):
+	# End effector positions and manipulability of the joint vectors Q
+	S = manip.S
+	J, T = jacobPoseBatch(S, Q, manip.N)
+	P = T[:, :, 3] + T[:, :, :3] @ manip.Home[3::4]
+	Ja = J[:, :, 3:] + np.cross(J[:, :, :3], P[:, None, :])
+	w = np.sqrt(np.maximum(np.linalg.det(np.einsum('mni,mnj->mij', Ja, Ja)), 0))
+	return P, w
+
+def solveTargets(manip, P, Q0, solver, tol):
+	# Whether ikin converged for each target, and the steps it took, NaN for backends that don't
+	# report steps
+	converged = np.empty(len(P), dtype = bool)
+	iterations = np.empty(len(P))
+	for i, (p, q0) in enumerate(zip(P, Q0)):
+		q, steps, residual = manip.ikin(p, q0, solver, diagnostics = True)
+		converged[i] = residual < tol
+		iterations[i] = np.nan if steps is None else steps
+	return converged, iterations
+
+def gaitCoverage(workspace, robot, leg, gait, inputs, samples = 64, period = None, **criteria):
+	# Fraction of the leg's foot targets over a gait cycle (the gait's period by default) that
+	# lie in voxels meeting the criteria of WorkspaceMap.contains
+	period = gait.checkPeriod(period)
+	phases = np.arange(samples) * period / samples
+	i = robot.Legs.index(leg)
+	P = np.array([[0.0254 * a[i] for a in robot.gaitTargets(inputs, phase / gait.stepFrequency, gait)] for phase in phases])
+	return float(np.mean(workspace.contains(P, **criteria)))
+
+def main():
+	from Quadruped import Quadruped
+	quick = "--quick" in argv
+	outputs = [a for a in argv[1:] if not a.startswith("--")]
+	robot = Quadruped(headless = True)
+	leg = robot.Legs[2]
+	workspace = mapWorkspace(leg.manip, resolution = 0.02 if quick else 0.01,
+		jointLower = -pi / 2, jointUpper = pi / 2, jointSamples = 20000 if quick else 200000, targetSamples = 5000 if quick else 50000,
+		solver = Manipulator.SOLVER_LM if "--lm" in argv else Manipulator.SOLVER_DLS)
+	if outputs:
+		workspace.save(outputs[0])
+
+	reached = workspace.reachCount > 0
+	print(f"\n{leg.legTypeString} Leg Workspace: {reached.sum()} of {reached.size} voxels reachable")
+	print(f"  Convergence Rate:\t\t{workspace.converged.sum() / workspace.attempts.sum():.3f}")
+	if workspace.iterationsKnown:
+		print(f"  Mean Iterations:\t\t{workspace.iterations.sum() / workspace.attempts.sum():.1f}")
+	# Foot targets over a cycle at the corners of the stick and trigger ranges
+	corners = [GaitInputs(LeftX = x, LeftY = y, LeftTrigger = t, RightTrigger = t) for x in (-1, 1) for y in (-1, 1) for t in (0, 1)]
+	for gait in robot.Gaits:
+		reachable = np.mean([gaitCoverage(workspace, robot, leg, gait, inputs, minConvergence = 0) for inputs in corners])
+		converging = np.mean([gaitCoverage(workspace, robot, leg, gait, inputs, minConvergence = 0.9) for inputs in corners])
+		print(f"  {gait.descriptionText}:\t{100 * reachable:.0f}% of full stick targets sampled, {100 * converging:.0f}% in voxels with 90% convergence")
+
+if __name__ == "__main__":
+	main()
@@ -1,5 +1,7 @@
 
 import os
+from Profiler import profiled
+from ControllerInputs import AxisNames, ButtonNames
 
 if os.name == "nt":
 	import ctypes
@@ -19,7 +21,7 @@ else:
 	import struct
 
 class XboxController:
-	ButtonNames = ('A', 'B', 'X', 'Y', 'LB', 'RB', 'Start', 'Select')
+	ButtonNames = ButtonNames
 
 	def __init__(self, userIndex = 0):
 		self.userIndex = userIndex
@@ -47,7 +49,7 @@ class XboxController:
 	def _clearState(self):
 		self.Connected = False
 
-		for a in ('LeftX', 'LeftY', 'RightX', 'RightY', 'LeftTrigger', 'RightTrigger', 'DpadX', 'DpadY'):
+		for a in AxisNames:
 			self.__setattr__(a, 0)
 
 		for b in XboxController.ButtonNames:
@@ -65,6 +67,7 @@ class XboxController:
 		def __exit__(self, *args):
 			return
 
+		@profiled
 		def update(self, *args):
 			state = _XinputState()
 			if XboxController._xInputDll.XInputGetState(ctypes.c_uint32(self.userIndex), ctypes.byref(state)):
@@ -104,31 +107,57 @@ class XboxController:
 			else:
 				self.Connected = True
 
+		# Joystick events are 8 bytes: a ms timestamp, a value, a type and an index
+		_eventFormat = struct.Struct("IhBB")
+		_readSize = 64 * _eventFormat.size
+
+		@profiled
 		def update(self, *args):
-			while self.Connected:
+			# Drains every pending event, reading as many as fit in each call, including right
+			# after connecting. Axis events are coalesced up to each button event, so every axis
+			# is set once per run of axis events, and button callbacks see the axes as they were
+			# when the button changed.
+			if not self.Connected:
+				self._connect()
+				if not self.Connected:
+					return
+			data = b''
+			while True:
 				try:
-					eventValue, eventType, eventIndex = struct.unpack_from("hBB", os.read(self._fid, 8), offset = 4)
+					chunk = os.read(self._fid, XboxController._readSize)
 				except BlockingIOError:
-					return
+					break
 				except (FileNotFoundError, OSError):
 					self._clearState()
 					return
+				data += chunk
+				if len(chunk) < XboxController._readSize:
+					break
 
+			axes = dict()
+			for _, eventValue, eventType, eventIndex in XboxController._eventFormat.iter_unpack(data[:len(data) - len(data) % 8]):
 				if eventType == 1:
-					self.__setattr__(XboxController.ButtonNames[eventIndex], eventValue & 1)
-					self._onButton[2 * eventIndex + (eventValue & 1)]()
+					if eventIndex < len(XboxController.ButtonNames):
+						self._setAxes(axes)
+						axes.clear()
+						eventValue &= 1
+						self.__setattr__(XboxController.ButtonNames[eventIndex], eventValue)
+						self._onButton[2 * eventIndex + eventValue]()
 				elif eventType == 2:
-					match eventIndex:
-						case 0: self.LeftX = XboxController._deadband(eventValue)
-						case 1: self.LeftY = -XboxController._deadband(eventValue)
-						case 2: self.LeftTrigger = (eventValue + 0x7FFF) / 0xFFFE
-						case 3: self.RightX = XboxController._deadband(eventValue)
-						case 4: self.RightY = -XboxController._deadband(eventValue)
-						case 5: self.RightTrigger = (eventValue + 0x7FFF) / 0xFFFE
-						case 6: self.DpadX = (eventValue > 0) - (eventValue < 0)
-						case 7: self.DpadY = (eventValue < 0) - (eventValue > 0)
-			else:
-				self._connect()
+					axes[eventIndex] = eventValue
+			self._setAxes(axes)
+
+		def _setAxes(self, axes):
+			for eventIndex, eventValue in axes.items():
+				match eventIndex:
+					case 0: self.LeftX = XboxController._deadband(eventValue)
+					case 1: self.LeftY = -XboxController._deadband(eventValue)
+					case 2: self.LeftTrigger = (eventValue + 0x7FFF) / 0xFFFE
+					case 3: self.RightX = XboxController._deadband(eventValue)
+					case 4: self.RightY = -XboxController._deadband(eventValue)
+					case 5: self.RightTrigger = (eventValue + 0x7FFF) / 0xFFFE
+					case 6: self.DpadX = (eventValue > 0) - (eventValue < 0)
+					case 7: self.DpadY = (eventValue < 0) - (eventValue > 0)
 	
 	@staticmethod
 	def _deadband(x, db = 0x1000, sat = 0x8000):